@@ -7,8 +7,11 @@ from routes.product_routes import product_ns
 from routes.category_routes import category_ns
 from routes.product_search import search_ns
 from routes.order_routes import order_ns
+from routes.sales_routes import sales_ns
 from utils.mongo_utils import MongoJSONEncoder
+from indexes import ensure_indexes
 import json
+import threading
 
 # Load environment variables
 load_dotenv()
@@ -46,6 +49,22 @@ api.add_namespace(product_ns, path="/api/products")
 api.add_namespace(category_ns, path="/api/categories")
 api.add_namespace(search_ns, path="/api/product-search")
 api.add_namespace(order_ns, path="/api/orders")
+api.add_namespace(sales_ns, path="/api/sales")
+
+def bootstrap_indexes():
+    """Create missing indexes from the registry without blocking startup"""
+    try:
+        for collection_name, result in ensure_indexes().items():
+            if result['created']:
+                print(f"Created indexes on {collection_name}: {', '.join(result['created'])}")
+            for name, error in result['errors'].items():
+                print(f"Could not create index {name} on {collection_name}: {error}")
+    except Exception as e:
+        print(f"Error ensuring indexes: {str(e)}")
+
+# Ensure indexes at startup (disable with ENSURE_INDEXES_ON_STARTUP=false and use manage.py instead)
+if os.getenv("ENSURE_INDEXES_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+    threading.Thread(target=bootstrap_indexes, daemon=True).start()
 
 if __name__ == "__main__":
     app.run(debug=True) 
\ No newline at end of file
@@ -16,4 +16,8 @@ db = client[db_name]
 # Collections
 products_collection = db.products
 categories_collection = db.categories
-orders_collection = db.orders 
\ No newline at end of file
+orders_collection = db.orders
+catalog_meta_collection = db.catalog_meta
+order_counters_collection = db.order_counters
+idempotency_keys_collection = db.idempotency_keys
+sales_rollups_collection = db.sales_rollups
@@ -0,0 +1,174 @@
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from database import db
+import os
+
+# Index registry: collection name -> indexes that should exist on it.
+# Every index is named explicitly so the report can match it against the database.
+INDEXES = {
+    'products': [
+        # Cursor pagination of /api/products and the default search sort
+        IndexModel([('created_at', ASCENDING), ('_id', ASCENDING)], name='created_at_id'),
+
+        # Search filters combined with the supported sort fields. Searches sort by
+        # (field, _id), so _id is part of every sort index.
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)], name='status_created_at_id'),
+        IndexModel([('status', ASCENDING), ('price', ASCENDING), ('_id', ASCENDING)], name='status_price_id'),
+        IndexModel([('brand', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)], name='brand_created_at_id'),
+        IndexModel([('brand', ASCENDING), ('price', ASCENDING), ('_id', ASCENDING)], name='brand_price_id'),
+        IndexModel([('category_ids', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)], name='category_ids_created_at_id'),
+        IndexModel([('category_ids', ASCENDING), ('price', ASCENDING), ('_id', ASCENDING)], name='category_ids_price_id'),
+
+        # Range filters and sorts on their own
+        IndexModel([('price', ASCENDING), ('_id', ASCENDING)], name='price_id'),
+        IndexModel([('discount_price', ASCENDING), ('_id', ASCENDING)], name='discount_price_id'),
+        IndexModel([('discount_percent', ASCENDING), ('_id', ASCENDING)], name='discount_percent_id'),
+
+        # Bulk import upserts are keyed by model, so a model identifies one product
+        IndexModel([('model', ASCENDING)], name='model_unique', unique=True),
+
+        # Spec filters and filter options
+        IndexModel([('specs.cpu', ASCENDING)], name='specs_cpu'),
+        IndexModel([('specs.ram', ASCENDING)], name='specs_ram'),
+        IndexModel([('specs.storage', ASCENDING)], name='specs_storage'),
+        IndexModel([('specs.gpu', ASCENDING)], name='specs_gpu'),
+        IndexModel([('specs.display', ASCENDING)], name='specs_display'),
+        IndexModel([('specs.os', ASCENDING)], name='specs_os'),
+
+        # Numeric spec range filters
+        IndexModel([('specs_numeric.ram_gb', ASCENDING)], name='specs_numeric_ram_gb'),
+        IndexModel([('specs_numeric.storage_gb', ASCENDING)], name='specs_numeric_storage_gb'),
+        IndexModel([('specs_numeric.display_inches', ASCENDING)], name='specs_numeric_display_inches'),
+        IndexModel([('specs_numeric.battery_wh', ASCENDING)], name='specs_numeric_battery_wh'),
+        IndexModel([('specs_numeric.gpu_vram_gb', ASCENDING)], name='specs_numeric_gpu_vram_gb'),
+    ],
+    'orders': [
+        IndexModel([('orderNumber', ASCENDING)], name='order_number_unique', unique=True),
+
+        # Order lists are sorted by (orderDate, _id); each filter leads its own index
+        IndexModel([('orderDate', ASCENDING), ('_id', ASCENDING)], name='order_date_id'),
+        IndexModel([('status', ASCENDING), ('orderDate', ASCENDING), ('_id', ASCENDING)], name='status_order_date_id'),
+        IndexModel([('customer.phone', ASCENDING), ('orderDate', ASCENDING), ('_id', ASCENDING)], name='customer_phone_order_date_id'),
+        IndexModel([('customer.email', ASCENDING), ('orderDate', ASCENDING), ('_id', ASCENDING)], name='customer_email_order_date_id'),
+    ],
+    'sales_rollups': [
+        # Dashboard reads: one dimension over a range of days
+        IndexModel([('dimension', ASCENDING), ('day', ASCENDING), ('key', ASCENDING)], name='dimension_day_key'),
+    ],
+    'idempotency_keys': [
+        # Stored responses expire after IDEMPOTENCY_KEY_TTL_SECONDS
+        IndexModel([('created_at', ASCENDING)], name='created_at_ttl',
+                   expireAfterSeconds=int(os.getenv('IDEMPOTENCY_KEY_TTL_SECONDS', '86400'))),
+    ],
+}
+
+# Indexes replaced by a registry index under a new name: collection -> {old name: new name}.
+# ensure_indexes drops the old index once its replacement exists.
+SUPERSEDED_INDEXES = {
+    'products': {
+        # Sort indexes that gained a trailing _id for keyset pagination
+        'status_created_at': 'status_created_at_id',
+        'status_price': 'status_price_id',
+        'brand_created_at': 'brand_created_at_id',
+        'brand_price': 'brand_price_id',
+        'category_ids_created_at': 'category_ids_created_at_id',
+        'category_ids_price': 'category_ids_price_id',
+        'price': 'price_id',
+        'discount_price': 'discount_price_id',
+        'discount_percent': 'discount_percent_id',
+        'model': 'model_unique',
+    },
+}
+
+# Index options that make two indexes with the same key different
+_COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+def _normalize_key(key):
+    """Turn an index key (SON, dict or list of pairs) into a comparable list of (field, direction)."""
+    items = key.items() if hasattr(key, 'items') else key
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in items]
+
+def _index_signature(spec):
+    """Key and options of an index, from an IndexModel document or index_information() entry."""
+    options = {option: spec.get(option) for option in _COMPARED_OPTIONS if spec.get(option) is not None}
+    if options.get('unique') is False:
+        del options['unique']
+    return _normalize_key(spec['key']), options
+
+def index_report(database=db):
+    """Compare the registry with the indexes that exist in the database.
+
+    Returns {collection: {'missing': [...], 'extra': [...], 'mismatched': [...], 'superseded': [...]}}.
+    Superseded indexes (see SUPERSEDED_INDEXES) are reported on their own
+    rather than as extra. The built-in _id index is never reported as extra.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        existing = database[collection_name].index_information()
+        expected = {model.document['name']: model.document for model in models}
+        replaced = SUPERSEDED_INDEXES.get(collection_name, {})
+
+        missing = [name for name in expected if name not in existing]
+        superseded = [name for name in existing if name in replaced and name not in expected]
+        extra = [name for name in existing if name not in expected and name not in replaced and name != '_id_']
+        mismatched = [
+            name for name in expected
+            if name in existing and _index_signature(expected[name]) != _index_signature(existing[name])
+        ]
+
+        report[collection_name] = {'missing': missing, 'extra': extra, 'mismatched': mismatched, 'superseded': superseded}
+    return report
+
+def ensure_indexes(database=db, drop_extra=False):
+    """Create every missing index from the registry. Safe to run repeatedly.
+
+    Indexes are created one at a time so a failure (e.g. duplicate values for a
+    unique index) is reported without stopping the others. A superseded index
+    is dropped once the index replacing it exists, so a replacement that cannot
+    be built (e.g. a unique index over duplicates) leaves the old one in place.
+    With drop_extra=True, indexes that are not in the registry are dropped.
+
+    Returns {collection: {'created': [...], 'dropped': [...], 'errors': {name: message}}}.
+    """
+    report = index_report(database)
+    summary = {}
+    for collection_name, models in INDEXES.items():
+        collection = database[collection_name]
+        state = report[collection_name]
+        result = {'created': [], 'dropped': [], 'errors': {}}
+
+        for name in state['mismatched']:
+            result['errors'][name] = 'An index with this name exists with a different definition'
+
+        for model in models:
+            name = model.document['name']
+            if name not in state['missing']:
+                continue
+            try:
+                collection.create_indexes([model])
+                result['created'].append(name)
+            except PyMongoError as e:
+                result['errors'][name] = str(e)
+
+        replaced = SUPERSEDED_INDEXES.get(collection_name, {})
+        for name in state['superseded']:
+            replacement = replaced[name]
+            if replacement in state['missing'] and replacement not in result['created']:
+                continue
+            try:
+                collection.drop_index(name)
+                result['dropped'].append(name)
+            except PyMongoError as e:
+                result['errors'][name] = str(e)
+
+        if drop_extra:
+            for name in state['extra']:
+                try:
+                    collection.drop_index(name)
+                    result['dropped'].append(name)
+                except PyMongoError as e:
+                    result['errors'][name] = str(e)
+
+        summary[collection_name] = result
+    return summary
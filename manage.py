@@ -0,0 +1,103 @@
+"""Maintenance commands.
+
+Usage:
+    python manage.py ensure-indexes [--drop-extra]
+    python manage.py index-report
+    python manage.py migrate-category-ids [--batch-size N] [--restart]
+    python manage.py backfill-specs-numeric [--batch-size N] [--restart] [--all]
+    python manage.py migrate-stock-quantity [--batch-size N] [--restart]
+    python manage.py migrate-price-fields [--batch-size N] [--restart]
+    python manage.py rebuild-sales-rollups [--batch-size N]
+"""
+import argparse
+import json
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def ensure_indexes_command(args):
+    from indexes import ensure_indexes
+    summary = ensure_indexes(drop_extra=args.drop_extra)
+    print(json.dumps(summary, indent=2))
+    return 1 if any(result['errors'] for result in summary.values()) else 0
+
+def index_report_command(args):
+    from indexes import index_report
+    report = index_report()
+    print(json.dumps(report, indent=2))
+    return 1 if any(state['missing'] or state['mismatched'] or state['superseded'] for state in report.values()) else 0
+
+def migrate_category_ids_command(args):
+    from migrations.category_ids import migrate_category_ids
+    checkpoint = migrate_category_ids(batch_size=args.batch_size, restart=args.restart)
+    print(json.dumps(checkpoint, indent=2, default=str))
+    return 0
+
+def backfill_specs_numeric_command(args):
+    from migrations.specs_numeric import backfill_specs_numeric
+    checkpoint = backfill_specs_numeric(batch_size=args.batch_size, restart=args.restart, recompute=args.all)
+    print(json.dumps(checkpoint, indent=2, default=str))
+    return 0
+
+def migrate_stock_quantity_command(args):
+    from migrations.stock_quantity import migrate_stock_quantity
+    checkpoint = migrate_stock_quantity(batch_size=args.batch_size, restart=args.restart)
+    print(json.dumps(checkpoint, indent=2, default=str))
+    return 0
+
+def migrate_price_fields_command(args):
+    from migrations.price_fields import migrate_price_fields
+    checkpoint = migrate_price_fields(batch_size=args.batch_size, restart=args.restart)
+    print(json.dumps(checkpoint, indent=2, default=str))
+    return 0
+
+def rebuild_sales_rollups_command(args):
+    from database import db
+    from utils.sales_rollups import rebuild_sales_rollups
+    summary = rebuild_sales_rollups(db, batch_size=args.batch_size)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Product catalog maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ensure_parser = subparsers.add_parser('ensure-indexes', help='Create missing indexes from the registry')
+    ensure_parser.add_argument('--drop-extra', action='store_true', help='Drop indexes that are not in the registry')
+    ensure_parser.set_defaults(func=ensure_indexes_command)
+
+    report_parser = subparsers.add_parser('index-report', help='Show missing, extra and mismatched indexes')
+    report_parser.set_defaults(func=index_report_command)
+
+    category_ids_parser = subparsers.add_parser('migrate-category-ids', help='Convert stored string category IDs to ObjectIds')
+    category_ids_parser.add_argument('--batch-size', type=int, default=500, help='Products updated per batch')
+    category_ids_parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint and start over')
+    category_ids_parser.set_defaults(func=migrate_category_ids_command)
+
+    specs_numeric_parser = subparsers.add_parser('backfill-specs-numeric', help='Derive specs_numeric for existing products')
+    specs_numeric_parser.add_argument('--batch-size', type=int, default=500, help='Products updated per batch')
+    specs_numeric_parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint and start over')
+    specs_numeric_parser.add_argument('--all', action='store_true', help='Recompute products that already have specs_numeric')
+    specs_numeric_parser.set_defaults(func=backfill_specs_numeric_command)
+
+    stock_parser = subparsers.add_parser('migrate-stock-quantity', help='Convert stored string stock quantities to integers')
+    stock_parser.add_argument('--batch-size', type=int, default=500, help='Products updated per batch')
+    stock_parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint and start over')
+    stock_parser.set_defaults(func=migrate_stock_quantity_command)
+
+    price_parser = subparsers.add_parser('migrate-price-fields', help='Convert stored string prices and discounts to numbers')
+    price_parser.add_argument('--batch-size', type=int, default=500, help='Products updated per batch')
+    price_parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint and start over')
+    price_parser.set_defaults(func=migrate_price_fields_command)
+
+    rollups_parser = subparsers.add_parser('rebuild-sales-rollups', help='Recompute the sales_rollups collection from all orders')
+    rollups_parser.add_argument('--batch-size', type=int, default=1000, help='Orders read per batch')
+    rollups_parser.set_defaults(func=rebuild_sales_rollups_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
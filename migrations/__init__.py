@@ -0,0 +1 @@
+# Migrations package initialization
\ No newline at end of file
@@ -0,0 +1,43 @@
+from bson import ObjectId
+from database import db
+from migrations.runner import run_batched_migration
+
+MIGRATION_NAME = 'category_ids_to_object_ids'
+
+# Products that still store at least one category ID as a string
+STRING_CATEGORY_IDS_QUERY = {'category_ids': {'$type': 'string'}}
+
+def convert_category_ids(product):
+    """Update converting a product's string category IDs to ObjectIds.
+
+    IDs that are not valid ObjectIds are left in place and reported, since
+    they cannot reference a category.
+    """
+    category_ids = []
+    invalid = []
+    for category_id in product.get('category_ids') or []:
+        if isinstance(category_id, str):
+            category_id = category_id.strip()
+            if ObjectId.is_valid(category_id):
+                category_id = ObjectId(category_id)
+            else:
+                invalid.append(category_id)
+        category_ids.append(category_id)
+
+    if invalid:
+        print(f"Product {product['_id']} has invalid category IDs: {invalid}")
+    if len(invalid) == len(category_ids):
+        return None
+    return {'$set': {'category_ids': category_ids}}
+
+def migrate_category_ids(batch_size=500, restart=False, database=db):
+    """Convert every stored string category ID to an ObjectId"""
+    return run_batched_migration(
+        MIGRATION_NAME,
+        database.products,
+        STRING_CATEGORY_IDS_QUERY,
+        convert_category_ids,
+        batch_size=batch_size,
+        restart=restart,
+        database=database
+    )
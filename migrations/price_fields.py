@@ -0,0 +1,46 @@
+from database import db
+from migrations.runner import run_batched_migration
+
+MIGRATION_NAME = 'price_fields_to_numbers'
+
+# Price fields stored as the submitted form strings
+PRICE_FIELDS = ('price', 'discount_percent')
+STRING_PRICE_QUERY = {'$or': [{field: {'$type': 'string'}} for field in PRICE_FIELDS]}
+
+def _to_number(value):
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+def convert_price_fields(product):
+    """Update storing a product's price and discount_percent as numbers.
+
+    Values that are not numbers are left in place and reported; the search
+    engines sort such products after every priced one, like MongoDB does.
+    """
+    converted = {}
+    for field in PRICE_FIELDS:
+        value = product.get(field)
+        if not isinstance(value, str):
+            continue
+        try:
+            converted[field] = _to_number(value)
+        except ValueError:
+            print(f"Product {product['_id']} has an invalid {field}: {value!r}")
+    if not converted:
+        return None
+    return {'$set': converted}
+
+def migrate_price_fields(batch_size=500, restart=False, database=db):
+    """Convert every stored string price and discount_percent to a number"""
+    return run_batched_migration(
+        MIGRATION_NAME,
+        database.products,
+        STRING_PRICE_QUERY,
+        convert_price_fields,
+        batch_size=batch_size,
+        restart=restart,
+        database=database
+    )
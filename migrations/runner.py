@@ -0,0 +1,64 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from database import db
+from utils.catalog_version import CatalogVersion
+
+def run_batched_migration(name, collection, query, transform, batch_size=500, restart=False, database=db):
+    """Apply `transform` to every document matching `query`, in _id order and in batches.
+
+    `transform(document)` returns an update document, or None to leave the
+    document unchanged. Each update is guarded by `query`, so a document that a
+    concurrent write already fixed is not overwritten. Progress is checkpointed
+    in the `migrations` collection after every batch, so an interrupted run
+    resumes after the last processed _id. A completed migration, or any
+    migration run with restart=True, starts a new pass from the beginning.
+
+    Migrations rewrite catalog documents behind the API's back, so the catalog
+    version of `database` is bumped after every batch that modified documents;
+    snapshots and caches keyed by the version then pick up the new data.
+
+    Returns the checkpoint document (last_id, processed, modified, skipped, completed).
+    """
+    checkpoints = database.migrations
+    version = CatalogVersion(database.catalog_meta)
+    checkpoint = checkpoints.find_one({'_id': name})
+
+    # Start a new pass unless an interrupted one can be resumed
+    if restart or not checkpoint or checkpoint.get('completed'):
+        checkpoint = {
+            '_id': name, 'last_id': None, 'processed': 0, 'modified': 0, 'skipped': 0,
+            'completed': False, 'started_at': datetime.now()
+        }
+
+    while True:
+        batch_query = query
+        if checkpoint['last_id'] is not None:
+            batch_query = {'$and': [query, {'_id': {'$gt': checkpoint['last_id']}}]}
+        documents = list(collection.find(batch_query).sort('_id', 1).limit(batch_size))
+        if not documents:
+            break
+
+        operations = []
+        for document in documents:
+            update = transform(document)
+            if update:
+                operations.append(UpdateOne({'$and': [{'_id': document['_id']}, query]}, update))
+            else:
+                checkpoint['skipped'] += 1
+
+        if operations:
+            result = collection.bulk_write(operations, ordered=False)
+            checkpoint['modified'] += result.modified_count
+            if result.modified_count:
+                version.bump()
+
+        checkpoint['processed'] += len(documents)
+        checkpoint['last_id'] = documents[-1]['_id']
+        checkpoint['updated_at'] = datetime.now()
+        checkpoints.replace_one({'_id': name}, checkpoint, upsert=True)
+        print(f"{name}: processed {checkpoint['processed']} documents, modified {checkpoint['modified']}")
+
+    checkpoint['completed'] = True
+    checkpoint['updated_at'] = datetime.now()
+    checkpoints.replace_one({'_id': name}, checkpoint, upsert=True)
+    return checkpoint
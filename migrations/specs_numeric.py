@@ -0,0 +1,25 @@
+from database import db
+from migrations.runner import run_batched_migration
+from utils.spec_parser import derive_specs_numeric
+
+MIGRATION_NAME = 'backfill_specs_numeric'
+
+# Products written before specs_numeric was derived on write
+MISSING_SPECS_NUMERIC_QUERY = {'specs_numeric': {'$exists': False}}
+
+def specs_numeric_update(product):
+    """Update setting specs_numeric from the product's specs"""
+    return {'$set': {'specs_numeric': derive_specs_numeric(product.get('specs'))}}
+
+def backfill_specs_numeric(batch_size=500, restart=False, recompute=False, database=db):
+    """Derive specs_numeric for products missing it, or for every product with recompute=True
+    (e.g. after the spec parser learned a new format)"""
+    return run_batched_migration(
+        MIGRATION_NAME + ('_all' if recompute else ''),
+        database.products,
+        {} if recompute else MISSING_SPECS_NUMERIC_QUERY,
+        specs_numeric_update,
+        batch_size=batch_size,
+        restart=restart,
+        database=database
+    )
@@ -0,0 +1,33 @@
+from database import db
+from migrations.runner import run_batched_migration
+
+MIGRATION_NAME = 'stock_quantity_to_int'
+
+# Products whose stock was stored as the submitted form string
+STRING_STOCK_QUERY = {'stock_quantity': {'$type': 'string'}}
+
+def convert_stock_quantity(product):
+    """Update storing a product's stock_quantity as an integer.
+
+    Values that are not whole numbers are left in place and reported, since
+    stock reservations cannot compare them.
+    """
+    value = product.get('stock_quantity').strip()
+    try:
+        stock_quantity = int(value)
+    except ValueError:
+        print(f"Product {product['_id']} has an invalid stock_quantity: {value!r}")
+        return None
+    return {'$set': {'stock_quantity': stock_quantity}}
+
+def migrate_stock_quantity(batch_size=500, restart=False, database=db):
+    """Convert every stored string stock_quantity to an integer"""
+    return run_batched_migration(
+        MIGRATION_NAME,
+        database.products,
+        STRING_STOCK_QUERY,
+        convert_stock_quantity,
+        batch_size=batch_size,
+        restart=restart,
+        database=database
+    )
@@ -3,8 +3,10 @@ from flask_restx import Namespace, Resource, fields
 from bson import ObjectId
 from datetime import datetime
 from marshmallow import ValidationError
+from pymongo import ReturnDocument
 from database import categories_collection
 from schemas.category_schema import get_category_models, CategorySchema
+from utils import catalog_events
 import re
 
 # Create namespace
@@ -77,13 +79,11 @@ class CategoryList(Resource):
             data['created_at'] = now
             data['updated_at'] = now
             
-            # Insert into database
-            result = categories_collection.insert_one(data)
+            # Insert into database (insert_one adds the generated _id to data)
+            categories_collection.insert_one(data)
+            catalog_events.category_changed(data['_id'])
             
-            # Get the created category
-            created_category = categories_collection.find_one({"_id": result.inserted_id})
-            
-            return format_category(created_category), 201
+            return format_category(data), 201
         except Exception as e:
             return {"message": f"Error creating category: {str(e)}"}, 500
 
@@ -116,10 +116,6 @@ class Category(Resource):
         try:
             if not is_valid_object_id(id):
                 return {"message": f"Invalid category ID format: {id}"}, 400
-                
-            category = categories_collection.find_one({"_id": ObjectId(id)})
-            if not category:
-                return {"message": f"Category with ID {id} not found"}, 404
             
             # Get form data
             data = {}
@@ -137,14 +133,15 @@ class Category(Resource):
             # Update timestamp
             data['updated_at'] = datetime.utcnow()
             
-            # Update category in database
-            categories_collection.update_one(
+            # Update category in database and get the updated version back
+            updated_category = categories_collection.find_one_and_update(
                 {"_id": ObjectId(id)},
-                {"$set": data}
+                {"$set": data},
+                return_document=ReturnDocument.AFTER
             )
-            
-            # Get updated category
-            updated_category = categories_collection.find_one({"_id": ObjectId(id)})
+            if not updated_category:
+                return {"message": f"Category with ID {id} not found"}, 404
+            catalog_events.category_changed(id)
             
             return format_category(updated_category)
         except Exception as e:
@@ -158,13 +155,11 @@ class Category(Resource):
             if not is_valid_object_id(id):
                 return {"message": f"Invalid category ID format: {id}"}, 400
             
-            # Check if category exists
-            category = categories_collection.find_one({"_id": ObjectId(id)})
-            if not category:
-                return {"message": f"Category with ID {id} not found"}, 404
-            
             # Delete the category from the collection
-            categories_collection.delete_one({"_id": ObjectId(id)})
+            result = categories_collection.delete_one({"_id": ObjectId(id)})
+            if result.deleted_count == 0:
+                return {"message": f"Category with ID {id} not found"}, 404
+            catalog_events.category_changed(id)
             
             return "", 204
         except Exception as e:
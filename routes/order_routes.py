@@ -1,11 +1,18 @@
 from flask import request
-from flask_restx import Namespace, Resource, fields
-from database import products_collection, orders_collection
+from flask_restx import Namespace, Resource, fields, inputs
+from database import products_collection, orders_collection, order_counters_collection, idempotency_keys_collection, sales_rollups_collection
 from bson import ObjectId
-from datetime import datetime
-from utils.mongo_utils import object_id_to_str, str_to_object_id
-import random
-import string
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+from utils.mongo_utils import object_id_to_str, str_to_object_id, parse_json
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter, keyset_sort, InvalidCursor
+from utils.order_numbers import OrderNumberAllocator
+from utils.stock import reserve_stock, release_stock
+from utils.idempotency import IdempotencyStore, idempotent, IDEMPOTENCY_HEADER
+from utils.sales_rollups import record_order
+from utils.auth import is_admin_request, ADMIN_KEY_HEADER
+from utils import catalog_events
+import os
 
 # Create namespace for order operations
 order_ns = Namespace('orders', description='Order operations')
@@ -64,24 +71,212 @@ error_response_model = order_ns.model('ErrorResponse', {
     'errors': fields.List(fields.String, description='List of errors')
 })
 
-def generate_order_number():
-    """Generate a unique order number in the format TS-YYYYMMDD-XXX"""
-    date_part = datetime.now().strftime('%Y%m%d')
-    random_part = ''.join(random.choices(string.digits, k=3))
-    order_number = f"TS-{date_part}-{random_part}"
+# Embedded blobs left out of order lists unless full=true is requested
+ORDER_SUMMARY_PROJECTION = {'items.variantSpecs': 0, 'productInfo': 0}
+
+# Pagination limits for order lists
+DEFAULT_ORDER_PAGE_LIMIT = 20
+MAX_ORDER_PAGE_LIMIT = 100
+
+ORDER_STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+
+# Query parameters for listing orders. Lists are sorted by (orderDate, _id)
+order_list_parser = order_ns.parser()
+order_list_parser.add_argument('status', type=str, required=False, location='args',
+                               help=f'Comma-separated order statuses ({", ".join(ORDER_STATUSES)})')
+order_list_parser.add_argument('date_from', type=str, required=False, location='args',
+                               help='Orders placed on or after this date/time (ISO 8601, e.g. 2025-03-01)')
+order_list_parser.add_argument('date_to', type=str, required=False, location='args',
+                               help='Orders placed on or before this date/time (ISO 8601; a date includes the whole day)')
+order_list_parser.add_argument('phone', type=str, required=False, location='args', help='Customer phone number')
+order_list_parser.add_argument('email', type=str, required=False, location='args', help='Customer email')
+order_list_parser.add_argument('cursor', type=str, required=False, location='args',
+                               help='Opaque cursor returned as next_cursor by the previous page')
+order_list_parser.add_argument('limit', type=int, required=False, location='args', default=DEFAULT_ORDER_PAGE_LIMIT,
+                               help=f'Orders per page (max {MAX_ORDER_PAGE_LIMIT})')
+order_list_parser.add_argument('sort_order', type=str, required=False, location='args', default='desc',
+                               choices=['asc', 'desc'], help='Sort order by order date (asc, desc)')
+order_list_parser.add_argument('full', type=inputs.boolean, required=False, location='args', default=False,
+                               help='Return full orders instead of the summary projection')
+
+# Query parameters for looking up one order. Without the admin key, the
+# customer's phone or email must match the order.
+order_lookup_parser = order_ns.parser()
+order_lookup_parser.add_argument('phone', type=str, required=False, location='args', help='Customer phone number of the order')
+order_lookup_parser.add_argument('email', type=str, required=False, location='args', help='Customer email of the order')
+
+# Header carrying the admin key, documented on admin-only endpoints
+ADMIN_KEY_PARAM = {ADMIN_KEY_HEADER: {'in': 'header', 'description': 'Admin API key (ADMIN_API_KEY)', 'required': False}}
+
+def unauthorized_response():
+    return {"success": False, "message": "Unauthorized", "errors": [f"A valid {ADMIN_KEY_HEADER} header is required"]}, 401
+
+def customer_matches(order, phone, email):
+    """True when the given phone or email is the order's customer contact"""
+    customer = order.get('customer') or {}
+    if phone and phone.strip() and phone.strip() == str(customer.get('phone') or '').strip():
+        return True
+    if email and email.strip() and email.strip().lower() == str(customer.get('email') or '').strip().lower():
+        return True
+    return False
+
+def parse_order_date(value, end_of_range=False):
+    """Parse an ISO 8601 date or date/time filter value.
+
+    A plain date used as the end of a range covers the whole day. Returns
+    (datetime, operator). Raises ValueError for invalid values.
+    """
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if end_of_range:
+        if len(value) == 10:
+            return parsed + timedelta(days=1), '$lt'
+        return parsed, '$lte'
+    return parsed, '$gte'
+
+def build_order_query(args):
+    """MongoDB filter for the order list filters. Raises ValueError for invalid values."""
+    query = {}
+    if args.status:
+        statuses = [status.strip() for status in args.status.split(',') if status.strip()]
+        invalid = [status for status in statuses if status not in ORDER_STATUSES]
+        if invalid:
+            raise ValueError(f"Invalid status: {', '.join(invalid)}")
+        if statuses:
+            query['status'] = statuses[0] if len(statuses) == 1 else {'$in': statuses}
     
-    # Check if the order number already exists, if so, generate a new one
-    existing_order = orders_collection.find_one({"order_number": order_number})
-    if existing_order:
-        return generate_order_number()
+    date_range = {}
+    for value, end_of_range in ((args.date_from, False), (args.date_to, True)):
+        if value:
+            date, operator = parse_order_date(value, end_of_range)
+            date_range[operator] = date
+    if date_range:
+        query['orderDate'] = date_range
     
-    return order_number
+    if args.phone:
+        query['customer.phone'] = args.phone.strip()
+    if args.email:
+        query['customer.email'] = args.email.strip()
+    return query
+
+def format_order(order):
+    """Format an order document for API response"""
+    return parse_json(order)
+
+# Order numbers come from a per-day counter, reserved in blocks by each worker
+order_number_allocator = OrderNumberAllocator(
+    order_counters_collection,
+    block_size=int(os.getenv('ORDER_NUMBER_BLOCK_SIZE', '20'))
+)
+
+# Attempts at inserting an order whose number is already taken (e.g. by an
+# order numbered before the counter existed) before giving up
+ORDER_NUMBER_ATTEMPTS = 5
+
+def generate_order_number():
+    """Generate a unique order number in the format TS-YYYYMMDD-XXX"""
+    return order_number_allocator.next_order_number()
+
+# Product fields needed to price an order and copy its product info
+ORDER_PRODUCT_PROJECTION = {
+    'name': 1,
+    'brand': 1,
+    'price': 1,
+    'variant_specs': 1,
+    'colors': 1,
+    'thumbnail': 1,
+    'product_info': 1
+}
+
+def index_by_name(entries):
+    """Map name -> entry for a list of variants or colors, keeping the first entry of each name"""
+    indexed = {}
+    for entry in entries or []:
+        indexed.setdefault(entry.get('name'), entry)
+    return indexed
+
+def load_order_products(product_ids):
+    """Fetch every product referenced by an order in one query.
+
+    Returns {product ObjectId: (product, variants by name, colors by name)}.
+    """
+    products = {}
+    for product in products_collection.find({"_id": {"$in": list(set(product_ids))}}, ORDER_PRODUCT_PROJECTION):
+        products[product['_id']] = (
+            product,
+            index_by_name(product.get('variant_specs')),
+            index_by_name(product.get('colors'))
+        )
+    return products
+
+# Orders created with an Idempotency-Key header, so client retries return the first response
+order_idempotency = IdempotencyStore(
+    idempotency_keys_collection,
+    lock_seconds=int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '30')),
+    wait_seconds=float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+)
 
 @order_ns.route('')
 class OrderResource(Resource):
+    @order_ns.expect(order_list_parser)
+    @order_ns.doc(params=ADMIN_KEY_PARAM)
+    @order_ns.response(200, 'Page of orders')
+    @order_ns.response(400, 'Invalid filter or cursor', error_response_model)
+    @order_ns.response(401, 'Missing or invalid admin key', error_response_model)
+    def get(self):
+        """List orders, newest first, one page at a time (admin only)"""
+        if not is_admin_request():
+            return unauthorized_response()
+        args = order_list_parser.parse_args()
+        
+        try:
+            query = build_order_query(args)
+        except ValueError as e:
+            return {"success": False, "message": "Invalid filter", "errors": [str(e)]}, 400
+        
+        limit = max(1, min(MAX_ORDER_PAGE_LIMIT, args.limit or DEFAULT_ORDER_PAGE_LIMIT))
+        direction = 1 if args.sort_order == 'asc' else -1
+        
+        if args.cursor:
+            try:
+                order_date, last_id = decode_cursor(args.cursor, 'orderDate')
+            except InvalidCursor as e:
+                return {"success": False, "message": "Invalid cursor", "errors": [str(e)]}, 400
+            query = {'$and': [query, keyset_filter('orderDate', order_date, last_id, direction)]} if query \
+                else keyset_filter('orderDate', order_date, last_id, direction)
+        
+        # Fetch one extra order to find out whether another page exists
+        orders = list(
+            orders_collection.find(query, None if args.full else ORDER_SUMMARY_PROJECTION)
+            .sort(keyset_sort('orderDate', direction))
+            .limit(limit + 1)
+        )
+        
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            last = orders[-1]
+            next_cursor = encode_cursor('orderDate', last.get('orderDate'), last['_id'])
+        
+        return {
+            "success": True,
+            "data": {
+                "orders": [format_order(order) for order in orders],
+                "limit": limit,
+                "next_cursor": next_cursor
+            }
+        }
+    
     @order_ns.expect(order_request_model)
+    @order_ns.doc(params={IDEMPOTENCY_HEADER: {'in': 'header', 'description': 'Unique key of this order; retries with the same key return the first response', 'required': False}})
     @order_ns.response(201, 'Order created successfully', order_response_model)
     @order_ns.response(400, 'Invalid request', error_response_model)
+    @order_ns.response(409, 'Insufficient stock, or the same Idempotency-Key is still being processed')
+    @order_ns.response(422, 'Idempotency-Key was used for a different request')
+    @idempotent(order_idempotency)
     def post(self):
         """Create a new order"""
         try:
@@ -120,29 +315,31 @@ class OrderResource(Resource):
             discount_total = 0
             warnings = []  # For non-critical issues
             
+            # Validate product IDs, then load all products of the order in one query
+            item_product_ids = []
             for item in items:
                 product_id = item.get('productId')
-                
-                # Validate product ID
                 try:
-                    product_obj_id = ObjectId(product_id)
+                    item_product_ids.append(ObjectId(product_id))
                 except:
                     errors.append(f"Invalid product ID: {product_id}")
+                    item_product_ids.append(None)
+            
+            order_products = load_order_products([product_id for product_id in item_product_ids if product_id])
+            
+            for item, product_obj_id in zip(items, item_product_ids):
+                if product_obj_id is None:
                     continue
                 
-                # Fetch product from database
-                product = products_collection.find_one({"_id": product_obj_id})
-                if not product:
-                    errors.append(f"Product not found: {product_id}")
+                # Resolve product from the batch
+                if product_obj_id not in order_products:
+                    errors.append(f"Product not found: {item.get('productId')}")
                     continue
+                product, variants_by_name, colors_by_name = order_products[product_obj_id]
                 
                 # Validate variant
                 variant_name = item.get('variantName')
-                variant = None
-                for v in product.get('variant_specs', []):
-                    if v.get('name') == variant_name:
-                        variant = v
-                        break
+                variant = variants_by_name.get(variant_name)
                 
                 if not variant:
                     # If requested variant not found, check if any variants exist
@@ -158,11 +355,7 @@ class OrderResource(Resource):
                 
                 # Validate color
                 color_name = item.get('colorName')
-                color = None
-                for c in product.get('colors', []):
-                    if c.get('name') == color_name:
-                        color = c
-                        break
+                color = colors_by_name.get(color_name)
                 
                 if not color:
                     # If requested color not found, check if any colors exist
@@ -178,6 +371,9 @@ class OrderResource(Resource):
                 
                 # Get quantity
                 quantity = item.get('quantity', 1)
+                if not isinstance(quantity, int) or isinstance(quantity, bool):
+                    errors.append(f"Invalid quantity for product {product.get('name')}: {quantity}")
+                    continue
                 if quantity <= 0:
                     quantity = 1  # Default to 1 if quantity is invalid
                 
@@ -208,6 +404,7 @@ class OrderResource(Resource):
                 processed_item = {
                     "productId": product_obj_id,
                     "productName": product.get('name', ''),
+                    "brand": product.get('brand', ''),
                     "basePrice": base_price,
                     
                     # Variant selection
@@ -251,13 +448,11 @@ class OrderResource(Resource):
             # Generate order number
             order_number = generate_order_number()
             
-            # Copy product info
+            # Copy product info of the first product (already loaded with the batch)
             product_info = []
-            if processed_items and len(processed_items) > 0:
-                first_product_id = processed_items[0]["productId"]
-                product = products_collection.find_one({"_id": first_product_id})
-                if product and 'product_info' in product:
-                    product_info = product.get('product_info', [])
+            if processed_items:
+                product, _, _ = order_products[processed_items[0]["productId"]]
+                product_info = product.get('product_info', [])
             
             # Create order document
             order_document = {
@@ -279,8 +474,45 @@ class OrderResource(Resource):
                 "updatedAt": datetime.now()
             }
             
-            # Insert order into database
-            result = orders_collection.insert_one(order_document)
+            # Reserve stock for every product of the order. Only orders sharing a
+            # product contend with each other; nothing is kept if any item is short.
+            reserved_quantities = {}
+            for item in processed_items:
+                product_id = item["productId"]
+                reserved_quantities[product_id] = reserved_quantities.get(product_id, 0) + item["quantity"]
+            
+            short_product_ids = reserve_stock(products_collection, reserved_quantities)
+            if short_product_ids:
+                return {
+                    "success": False,
+                    "message": "Failed to create order",
+                    "errors": [
+                        f"Insufficient stock for product {order_products[product_id][0].get('name', str(product_id))}"
+                        for product_id in short_product_ids
+                    ]
+                }, 409
+            
+            # Insert order into database. orderNumber has a unique index, so a
+            # number that is already taken is replaced by the next one.
+            try:
+                for attempt in range(ORDER_NUMBER_ATTEMPTS):
+                    try:
+                        result = orders_collection.insert_one(order_document)
+                        break
+                    except DuplicateKeyError:
+                        if attempt == ORDER_NUMBER_ATTEMPTS - 1:
+                            raise
+                        order_number = generate_order_number()
+                        order_document["orderNumber"] = order_number
+            except Exception:
+                # The order was not stored, so give its stock back
+                release_stock(products_collection, reserved_quantities)
+                raise
+            finally:
+                catalog_events.stock_changed(reserved_quantities)
+            
+            # Add the order to the pre-aggregated sales rollups
+            record_order(sales_rollups_collection, order_document)
             
             # Format response
             response_items = []
@@ -317,4 +549,28 @@ class OrderResource(Resource):
                 "success": False,
                 "message": "Failed to create order",
                 "errors": [str(e)]
-            }, 400 
\ No newline at end of file
+            }, 400 
+
+@order_ns.route('/<string:order_number>')
+@order_ns.param('order_number', 'Order number (TS-YYYYMMDD-NNN)')
+class OrderByNumberResource(Resource):
+    @order_ns.expect(order_lookup_parser)
+    @order_ns.doc(params=ADMIN_KEY_PARAM)
+    @order_ns.response(200, 'Order found')
+    @order_ns.response(400, 'Phone or email missing', error_response_model)
+    @order_ns.response(404, 'Order not found', error_response_model)
+    def get(self, order_number):
+        """Get an order by its order number and the customer's phone or email"""
+        args = order_lookup_parser.parse_args()
+        admin = is_admin_request()
+        if not admin and not ((args.phone or '').strip() or (args.email or '').strip()):
+            return {"success": False, "message": "Invalid request", "errors": ["phone or email is required"]}, 400
+        
+        order = orders_collection.find_one({"orderNumber": order_number})
+        # An order whose contact does not match is reported as not found, so
+        # order numbers cannot be probed
+        if order and not admin and not customer_matches(order, args.phone, args.email):
+            order = None
+        if not order:
+            return {"success": False, "message": "Order not found", "errors": [f"Order not found: {order_number}"]}, 404
+        return {"success": True, "data": format_order(order)}
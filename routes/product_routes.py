@@ -1,13 +1,23 @@
 from flask import request, jsonify
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, inputs
 from bson import ObjectId
 from datetime import datetime
 from marshmallow import ValidationError
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from database import products_collection, categories_collection, db
-from utils.mongo_utils import format_product, save_file_to_gridfs, delete_file_from_gridfs
+from utils.mongo_utils import format_product, save_file_to_gridfs, delete_file_from_gridfs, to_category_object_ids
+from utils.spec_parser import derive_specs_numeric
+from utils.streaming import wants_ndjson, stream_ndjson, stream_json_array, STREAM_BATCH_SIZE
+from utils.projection import model_field_paths, build_projection, InvalidFields
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter, keyset_sort, get_sort_value, InvalidCursor
+from utils.cache import get_cache, cache_stats
+from utils.stock import without_stock, with_current_stock
+from utils import catalog_events
 from schemas.product_schema import get_product_models, ProductSchema
 import re
 import json
+import os
 
 # Create namespace
 product_ns = Namespace('products', description='Product operations')
@@ -15,8 +25,29 @@ product_ns = Namespace('products', description='Product operations')
 # Get models from schema
 product_model, product_input_model, product_form_parser, product_update_model, product_update_parser = get_product_models(product_ns)
 
-# Initialize validation schema
+# Initialize validation schemas
 product_schema = ProductSchema()
+bulk_product_schema = ProductSchema(many=True)
+
+# Server-side equivalent of price - (price * discount_percent / 100), used by pipeline updates
+_price_value = {"$toDouble": {"$ifNull": ["$price", 0]}}
+_discount_percent_value = {"$toDouble": {"$ifNull": ["$discount_percent", 0]}}
+DISCOUNT_PRICE_EXPRESSION = {
+    "$subtract": [_price_value, {"$divide": [{"$multiply": [_price_value, _discount_percent_value]}, 100]}]
+}
+
+# Cache of formatted products keyed by product ID
+product_cache = get_cache(
+    'products',
+    maxsize=int(os.getenv('PRODUCT_CACHE_SIZE', '1000')),
+    ttl=int(os.getenv('PRODUCT_CACHE_TTL', '300'))
+)
+
+# Keep the product cache in sync with product writes. Cached products leave
+# out stock_quantity, which is read again whenever they are served.
+catalog_events.subscribe('product_saved', lambda product: product_cache.set(product['_id'], without_stock(product)))
+catalog_events.subscribe('product_deleted', product_cache.delete)
+catalog_events.subscribe('products_changed', lambda query: product_cache.clear())
 
 # ObjectId validation regex pattern
 OBJECT_ID_PATTERN = re.compile(r'^[0-9a-fA-F]{24}$')
@@ -25,19 +56,152 @@ def is_valid_object_id(id_str):
     """Check if a string is a valid ObjectId format"""
     return bool(id_str and OBJECT_ID_PATTERN.match(id_str))
 
+# Numeric product fields and their allowed ranges. They are submitted as form
+# strings but stored as integers: orders reserve stock with $inc, and range
+# filters and sorts compare prices as numbers.
+INTEGER_FORM_FIELDS = {
+    'price': (0, None),
+    'discount_percent': (0, 100),
+    'stock_quantity': (0, None),
+}
+
+def coerce_integer_fields(data):
+    """Convert the integer fields present in `data` in place. Raises ValueError for invalid values."""
+    for field, (minimum, maximum) in INTEGER_FORM_FIELDS.items():
+        if field not in data:
+            continue
+        try:
+            value = int(data[field])
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be an integer")
+        if value < minimum:
+            raise ValueError(f"{field} must be at least {minimum}")
+        if maximum is not None and value > maximum:
+            raise ValueError(f"{field} must be at most {maximum}")
+        data[field] = value
+
+# Field paths accepted by the fields= parameter
+PRODUCT_FIELD_PATHS = model_field_paths(product_model)
+
+# Heavy fields left out of paginated list pages unless full=true is requested
+LIST_EXCLUDED_FIELDS = ['specs', 'variant_specs', 'colors', 'product_info', 'images', 'videos']
+LIST_PROJECTION = {field: 0 for field in LIST_EXCLUDED_FIELDS}
+
+# Pagination limits for list pages
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+# Query parameters for cursor pagination
+product_list_parser = product_ns.parser()
+product_list_parser.add_argument('cursor', type=str, required=False, location='args',
+                                 help='Opaque cursor returned as next_cursor by the previous page')
+product_list_parser.add_argument('limit', type=int, required=False, location='args',
+                                 help=f'Items per page (max {MAX_PAGE_LIMIT}). Enables cursor pagination')
+product_list_parser.add_argument('sort_by', type=str, required=False, location='args', default='created_at',
+                                 choices=['created_at', '_id'], help='Sort field (created_at, _id)')
+product_list_parser.add_argument('sort_order', type=str, required=False, location='args', default='desc',
+                                 choices=['asc', 'desc'], help='Sort order (asc, desc)')
+product_list_parser.add_argument('full', type=inputs.boolean, required=False, location='args', default=False,
+                                 help='Return full documents instead of the lightweight list projection')
+product_list_parser.add_argument('fields', type=str, required=False, location='args',
+                                 help='Comma-separated list of fields to return (e.g. name,thumbnail,price)')
+
+# Query parameters for fetching several products at once
+MAX_BATCH_IDS = 100
+product_batch_parser = product_ns.parser()
+product_batch_parser.add_argument('ids', type=str, required=True, location='args',
+                                  help=f'Comma-separated product IDs (max {MAX_BATCH_IDS})')
+product_batch_parser.add_argument('fields', type=str, required=False, location='args',
+                                  help='Comma-separated list of fields to return (e.g. name,thumbnail,price)')
+
+# Query parameters for bulk imports
+DEFAULT_BULK_BATCH_SIZE = 500
+MAX_BULK_BATCH_SIZE = 1000
+product_bulk_parser = product_ns.parser()
+product_bulk_parser.add_argument('ordered', type=inputs.boolean, required=False, location='args', default=False,
+                                 help='Stop at the first failed write instead of applying the remaining records')
+product_bulk_parser.add_argument('batch_size', type=int, required=False, location='args', default=DEFAULT_BULK_BATCH_SIZE,
+                                 help=f'Number of upserts sent per bulk_write call (max {MAX_BULK_BATCH_SIZE})')
+
+# Query parameters for a single product
+product_get_parser = product_ns.parser()
+product_get_parser.add_argument('fields', type=str, required=False, location='args',
+                                help='Comma-separated list of fields to return (e.g. name,thumbnail,price)')
+
 @product_ns.route('/')
 class ProductList(Resource):
     @product_ns.doc('list_products')
+    @product_ns.expect(product_list_parser)
     @product_ns.response(200, 'Success', [product_model])
+    @product_ns.response(400, 'Invalid cursor')
     def get(self):
-        """List all products"""
-        products = list(products_collection.find())
-        return [format_product(product) for product in products]
+        """List products (all of them, or one page at a time when cursor/limit is given)"""
+        args = product_list_parser.parse_args()
+        
+        try:
+            fields_projection = build_projection(args.fields, PRODUCT_FIELD_PATHS)
+        except InvalidFields as e:
+            return {"message": str(e)}, 400
+        
+        # Without cursor/limit return every product, streamed one document at a time
+        # (NDJSON when requested via the Accept header, otherwise a chunked JSON array)
+        if args.cursor is None and args.limit is None:
+            products_cursor = products_collection.find({}, fields_projection).batch_size(STREAM_BATCH_SIZE)
+            if wants_ndjson():
+                return stream_ndjson(products_cursor, format_product)
+            return stream_json_array(products_cursor, format_product)
+        
+        limit = max(1, min(MAX_PAGE_LIMIT, args.limit or DEFAULT_PAGE_LIMIT))
+        sort_field = args.sort_by
+        direction = 1 if args.sort_order == 'asc' else -1
+        
+        query = {}
+        if args.cursor:
+            try:
+                sort_value, last_id = decode_cursor(args.cursor, sort_field)
+            except InvalidCursor as e:
+                return {"message": str(e)}, 400
+            query = keyset_filter(sort_field, sort_value, last_id, direction)
+        
+        # Requested fields win over the default list projection. The sort key is
+        # always fetched so the next cursor can be built, and dropped afterwards.
+        strip_sort_field = False
+        if fields_projection:
+            projection = fields_projection
+            if sort_field not in projection:
+                projection = dict(projection, **{sort_field: 1})
+                strip_sort_field = True
+        else:
+            projection = None if args.full else LIST_PROJECTION
+        
+        # Fetch one extra document to find out whether another page exists
+        products = list(
+            products_collection.find(query, projection)
+            .sort(keyset_sort(sort_field, direction))
+            .limit(limit + 1)
+        )
+        
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = encode_cursor(sort_field, get_sort_value(last, sort_field), last['_id'])
+        
+        if strip_sort_field:
+            for product in products:
+                product.pop(sort_field, None)
+        
+        return {
+            'products': [format_product(product) for product in products],
+            'limit': limit,
+            'next_cursor': next_cursor
+        }
     
     @product_ns.doc('create_product')
     @product_ns.expect(product_form_parser)
     @product_ns.response(201, 'Product created', product_model)
     @product_ns.response(400, 'Validation Error')
+    @product_ns.response(409, 'A product with this model already exists')
     def post(self):
         """Create a new product with file uploads"""
         try:
@@ -56,7 +220,7 @@ class ProductList(Resource):
                     else:
                         data['specs'][field_name] = request.form[key]
                 elif key == 'category_ids':
-                    data['category_ids'] = request.form.getlist(key)
+                    data['category_ids'] = [category_id for category_id in request.form.getlist(key) if category_id.strip()]
                 elif key == 'highlights':
                     data['highlights'] = request.form.getlist(key)
                 elif key == 'variant_specs':
@@ -85,15 +249,27 @@ class ProductList(Resource):
             if errors:
                 return {"message": "Validation errors", "errors": errors}, 400
             
+            # Form values arrive as strings; numeric fields are stored as numbers
+            coerce_integer_fields(data)
+            
+            # Category IDs are always stored as ObjectIds
+            if 'category_ids' in data:
+                data['category_ids'] = to_category_object_ids(data['category_ids'])
+            
+            # Numeric spec attributes used by the range filters
+            data['specs_numeric'] = derive_specs_numeric(data.get('specs'))
+            
             # Store uploaded files
             data['images'] = []
             data['videos'] = []
+            new_file_ids = []
             
             # Handle thumbnail
             if 'thumbnail' in request.files:
                 thumbnail_file = request.files['thumbnail']
                 if thumbnail_file.filename:
                     thumbnail_id = save_file_to_gridfs(thumbnail_file, thumbnail_file.filename, thumbnail_file.content_type)
+                    new_file_ids.append(thumbnail_id)
                     data['thumbnail'] = str(thumbnail_id)
             
             # Handle individual image files
@@ -104,6 +280,7 @@ class ProductList(Resource):
                     image_file = request.files[image_key]
                     if image_file.filename:
                         image_id = save_file_to_gridfs(image_file, image_file.filename, image_file.content_type)
+                        new_file_ids.append(image_id)
                         data['images'].append(str(image_id))
             
             # Handle individual video files
@@ -114,6 +291,7 @@ class ProductList(Resource):
                     video_file = request.files[video_key]
                     if video_file.filename:
                         video_id = save_file_to_gridfs(video_file, video_file.filename, video_file.content_type)
+                        new_file_ids.append(video_id)
                         data['videos'].append(str(video_id))
 
             # Original method (keeping for backward compatibility)
@@ -122,6 +300,7 @@ class ProductList(Resource):
                 for image_file in image_files:
                     if image_file.filename:
                         image_id = save_file_to_gridfs(image_file, image_file.filename, image_file.content_type)
+                        new_file_ids.append(image_id)
                         data['images'].append(str(image_id))
             
             if 'videos' in request.files:
@@ -129,6 +308,7 @@ class ProductList(Resource):
                 for video_file in video_files:
                     if video_file.filename:
                         video_id = save_file_to_gridfs(video_file, video_file.filename, video_file.content_type)
+                        new_file_ids.append(video_id)
                         data['videos'].append(str(video_id))
 
             # Create timestamps
@@ -136,19 +316,28 @@ class ProductList(Resource):
             data['created_at'] = now
             data['updated_at'] = now
             
-            # Calculate discount price
-            price = float(data['price'])
-            discount_percent = float(data['discount_percent'])
-            data['discount_price'] = price - (price * discount_percent / 100)
-            
-            # Insert into database
-            result = products_collection.insert_one(data)
-            
-            # Get the created product
-            created_product = products_collection.find_one({"_id": result.inserted_id})
-            
-            return format_product(created_product), 201
-            
+            try:
+                # Calculate discount price
+                price = float(data['price'])
+                discount_percent = float(data['discount_percent'])
+                data['discount_price'] = price - (price * discount_percent / 100)
+                
+                # Insert into database (insert_one adds the generated _id to data)
+                products_collection.insert_one(data)
+            except Exception:
+                # The product was not stored, so drop the files stored for this request
+                for file_id in new_file_ids:
+                    delete_file_from_gridfs(file_id)
+                raise
+            
+            # Build the response from the inserted document
+            created_product = format_product(data)
+            catalog_events.product_saved(created_product)
+            
+            return created_product, 201
+            
+        except DuplicateKeyError:
+            return {"message": f"A product with model {data.get('model')} already exists"}, 409
         except Exception as e:
             return {"message": f"Error creating product: {str(e)}"}, 400
     
@@ -158,34 +347,48 @@ class ProductList(Resource):
 @product_ns.response(404, 'Product not found')
 class Product(Resource):
     @product_ns.doc('get_product')
+    @product_ns.expect(product_get_parser)
     @product_ns.response(200, 'Success', product_model)
     def get(self, id):
         """Get a product by ID"""
         if not is_valid_object_id(id):
             return {"message": "Invalid product ID format"}, 400
-            
-        product = products_collection.find_one({"_id": ObjectId(id)})
+        
+        args = product_get_parser.parse_args()
+        try:
+            projection = build_projection(args.fields, PRODUCT_FIELD_PATHS)
+        except InvalidFields as e:
+            return {"message": str(e)}, 400
+        
+        # Full documents are served from the product cache when possible
+        cache_key = str(ObjectId(id))
+        if projection is None:
+            cached_product = product_cache.get(cache_key)
+            if cached_product is not None:
+                return with_current_stock(products_collection, [cached_product])[0]
+            
+        product = products_collection.find_one({"_id": ObjectId(id)}, projection)
         if not product:
             return {"message": "Product not found"}, 404
+        
+        product = format_product(product)
+        if projection is None:
+            product_cache.set(cache_key, without_stock(product))
             
-        return format_product(product)
+        return product
     
     @product_ns.doc('update_product')
     @product_ns.expect(product_update_parser)
     @product_ns.response(200, 'Product updated', product_model)
     @product_ns.response(400, 'Validation Error')
+    @product_ns.response(409, 'Another product has this model')
     def put(self, id):
         """Update a product with file uploads"""
         if not is_valid_object_id(id):
             return {"message": "Invalid product ID format"}, 400
             
-        # Check if product exists
-        product = products_collection.find_one({"_id": ObjectId(id)})
-        if not product:
-            return {"message": "Product not found"}, 404
-            
         try:
-            # Get existing product data
+            # Collect the fields to update
             update_data = {}
             
             # Process form data
@@ -202,7 +405,7 @@ class Product(Resource):
                     else:
                         update_data['specs'][field_name] = request.form[key]
                 elif key == 'category_ids':
-                    update_data['category_ids'] = request.form.getlist(key)
+                    update_data['category_ids'] = [category_id for category_id in request.form.getlist(key) if category_id.strip()]
                 elif key == 'highlights':
                     update_data['highlights'] = request.form.getlist(key)
                 elif key == 'variant_specs':
@@ -226,34 +429,40 @@ class Product(Resource):
                 else:
                     update_data[key] = request.form[key]
             
-            # If we got price or discount_percent updates, recalculate discount_price
-            if 'price' in update_data or 'discount_percent' in update_data:
-                price = float(update_data.get('price', product.get('price', 0)))
-                discount_percent = float(update_data.get('discount_percent', product.get('discount_percent', 0)))
-                update_data['discount_price'] = price - (price * discount_percent / 100)
+            # Form values arrive as strings; numeric fields are stored as numbers
+            try:
+                coerce_integer_fields(update_data)
+            except ValueError as e:
+                return {"message": str(e)}, 400
+            
+            # Category IDs are always stored as ObjectIds
+            if 'category_ids' in update_data:
+                try:
+                    update_data['category_ids'] = to_category_object_ids(update_data['category_ids'])
+                except ValueError as e:
+                    return {"message": str(e)}, 400
+            
+            # The specs are replaced as a whole, so their numeric attributes are too
+            if 'specs' in update_data:
+                update_data['specs_numeric'] = derive_specs_numeric(update_data['specs'])
+            
+            # Handle file uploads. New files are stored first; the files they replace
+            # are deleted once the update has matched the product.
+            new_file_ids = []
+            replaced_media = set()
             
-            # Handle file uploads
             # Thumbnail
             if 'thumbnail' in request.files:
                 thumbnail_file = request.files['thumbnail']
                 if thumbnail_file.filename:
-                    # Delete old thumbnail if exists
-                    old_thumbnail_id = product.get('thumbnail')
-                    if old_thumbnail_id:
-                        delete_file_from_gridfs(ObjectId(old_thumbnail_id))
-                    
-                    # Save new thumbnail
                     thumbnail_id = save_file_to_gridfs(thumbnail_file, thumbnail_file.filename, thumbnail_file.content_type)
+                    new_file_ids.append(thumbnail_id)
                     update_data['thumbnail'] = str(thumbnail_id)
+                    replaced_media.add('thumbnail')
             
             # Images - individual files
             image_count = int(update_data.get('image_count', 0))
             if image_count > 0:
-                # Delete old images
-                for old_image_id in product.get('images', []):
-                    delete_file_from_gridfs(ObjectId(old_image_id))
-                
-                # Save new images
                 new_images = []
                 for i in range(image_count):
                     image_key = f'image_{i}'
@@ -261,18 +470,15 @@ class Product(Resource):
                         image_file = request.files[image_key]
                         if image_file.filename:
                             image_id = save_file_to_gridfs(image_file, image_file.filename, image_file.content_type)
+                            new_file_ids.append(image_id)
                             new_images.append(str(image_id))
                 
                 update_data['images'] = new_images
+                replaced_media.add('images')
             
             # Videos - individual files
             video_count = int(update_data.get('video_count', 0))
             if video_count > 0:
-                # Delete old videos
-                for old_video_id in product.get('videos', []):
-                    delete_file_from_gridfs(ObjectId(old_video_id))
-                
-                # Save new videos
                 new_videos = []
                 for i in range(video_count):
                     video_key = f'video_{i}'
@@ -280,9 +486,11 @@ class Product(Resource):
                         video_file = request.files[video_key]
                         if video_file.filename:
                             video_id = save_file_to_gridfs(video_file, video_file.filename, video_file.content_type)
+                            new_file_ids.append(video_id)
                             new_videos.append(str(video_id))
                 
                 update_data['videos'] = new_videos
+                replaced_media.add('videos')
             
             # Original methods (keeping for backward compatibility)
             # Images
@@ -290,51 +498,85 @@ class Product(Resource):
                 image_files = request.files.getlist('images')
                 if image_files and image_files[0].filename:
                     # If there are valid image files, we'll replace all images
-                    # Delete old images
-                    for old_image_id in product.get('images', []):
-                        delete_file_from_gridfs(ObjectId(old_image_id))
-                    
-                    # Save new images
                     new_images = []
                     for image_file in image_files:
                         if image_file.filename:
                             image_id = save_file_to_gridfs(image_file, image_file.filename, image_file.content_type)
+                            new_file_ids.append(image_id)
                             new_images.append(str(image_id))
                     
                     update_data['images'] = new_images
+                    replaced_media.add('images')
             
             # Videos
             if 'videos' in request.files:
                 video_files = request.files.getlist('videos')
                 if video_files and video_files[0].filename:
                     # If there are valid video files, we'll replace all videos
-                    # Delete old videos
-                    for old_video_id in product.get('videos', []):
-                        delete_file_from_gridfs(ObjectId(old_video_id))
-                    
-                    # Save new videos
                     new_videos = []
                     for video_file in video_files:
                         if video_file.filename:
                             video_id = save_file_to_gridfs(video_file, video_file.filename, video_file.content_type)
+                            new_file_ids.append(video_id)
                             new_videos.append(str(video_id))
                     
                     update_data['videos'] = new_videos
+                    replaced_media.add('videos')
             
             # Set updated timestamp
             update_data['updated_at'] = datetime.utcnow()
             
-            # Update in database
-            products_collection.update_one(
-                {"_id": ObjectId(id)},
-                {"$set": update_data}
-            )
-            
-            # Get the updated product
-            updated_product = products_collection.find_one({"_id": ObjectId(id)})
-            
-            return format_product(updated_product)
-            
+            # Update in database, getting the previous version back in the same round trip.
+            # If we got price or discount_percent updates, discount_price is recalculated
+            # by the server from the stored values, which needs a pipeline update.
+            recalculate_discount = 'price' in update_data or 'discount_percent' in update_data
+            if recalculate_discount:
+                update = [
+                    {"$set": {key: {"$literal": value} for key, value in update_data.items()}},
+                    {"$set": {"discount_price": DISCOUNT_PRICE_EXPRESSION}}
+                ]
+            else:
+                update = {"$set": update_data}
+            
+            try:
+                product = products_collection.find_one_and_update(
+                    {"_id": ObjectId(id)},
+                    update,
+                    return_document=ReturnDocument.BEFORE
+                )
+            except Exception:
+                # The update failed, so drop the files stored for this request
+                for file_id in new_file_ids:
+                    delete_file_from_gridfs(file_id)
+                raise
+            if not product:
+                # Nothing was updated, so drop the files stored for this request
+                for file_id in new_file_ids:
+                    delete_file_from_gridfs(file_id)
+                return {"message": "Product not found"}, 404
+            
+            # Delete the files that were replaced
+            if 'thumbnail' in replaced_media and product.get('thumbnail'):
+                delete_file_from_gridfs(ObjectId(product['thumbnail']))
+            for media_field in ('images', 'videos'):
+                if media_field in replaced_media:
+                    for old_file_id in product.get(media_field, []):
+                        delete_file_from_gridfs(ObjectId(old_file_id))
+            
+            # Apply the update to the previous version to build the response
+            updated_product = dict(product, **update_data)
+            if recalculate_discount:
+                price = float(updated_product.get('price') or 0)
+                discount_percent = float(updated_product.get('discount_percent') or 0)
+                updated_product['discount_price'] = price - (price * discount_percent / 100)
+            
+            updated_product = format_product(updated_product)
+            catalog_events.product_saved(updated_product)
+            
+            return updated_product
+            
+        except DuplicateKeyError:
+            return {"message": f"A product with model {update_data.get('model')} already exists"}, 409
         except Exception as e:
             return {"message": f"Error updating product: {str(e)}"}, 400
     
@@ -345,10 +587,11 @@ class Product(Resource):
         if not is_valid_object_id(id):
             return {"message": "Invalid product ID format"}, 400
             
-        # Get product to delete its files
-        product = products_collection.find_one({"_id": ObjectId(id)})
+        # Delete product, getting it back to delete its files
+        product = products_collection.find_one_and_delete({"_id": ObjectId(id)})
         if not product:
             return {"message": "Product not found"}, 404
+        catalog_events.product_deleted(ObjectId(id))
         
         # Delete all associated files (thumbnail, images, videos)
         # Thumbnail
@@ -369,11 +612,209 @@ class Product(Resource):
             if video_key in product:
                 delete_file_from_gridfs(ObjectId(product[video_key]))
         
-        # Delete product
-        products_collection.delete_one({"_id": ObjectId(id)})
-        
         return "", 204
 
+def parse_bulk_records():
+    """Read bulk import records from an NDJSON body or a JSON array body.
+
+    Returns a (records, errors) tuple where records is a list with one entry per
+    input record (None for lines that are not valid JSON objects) and errors maps
+    record indexes to error messages. Raises ValueError for unusable bodies.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        records = []
+        errors = {}
+        lines = [line for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        for index, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if not isinstance(record, dict):
+                errors[index] = "Invalid JSON object"
+                record = None
+            records.append(record)
+        return records, errors
+    
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        raise ValueError("Request body must be a JSON array or NDJSON")
+    
+    errors = {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors[index] = "Invalid JSON object"
+            records[index] = None
+    return records, errors
+
+@product_ns.route('/bulk')
+class ProductBulk(Resource):
+    @product_ns.doc('bulk_upsert_products')
+    @product_ns.expect(product_bulk_parser)
+    @product_ns.response(200, 'Import processed')
+    @product_ns.response(400, 'Invalid request body')
+    def post(self):
+        """Create or update many products keyed by model (JSON array or NDJSON body)"""
+        args = product_bulk_parser.parse_args()
+        batch_size = max(1, min(MAX_BULK_BATCH_SIZE, args.batch_size or DEFAULT_BULK_BATCH_SIZE))
+        ordered = args.ordered
+        
+        try:
+            records, parse_errors = parse_bulk_records()
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        
+        if not records:
+            return {"message": "No records to import"}, 400
+        
+        results = [None] * len(records)
+        for index, error in parse_errors.items():
+            results[index] = {"index": index, "status": "invalid", "errors": error}
+        
+        # Validate every parsed record in one pass
+        positions = [index for index, record in enumerate(records) if record is not None]
+        try:
+            loaded = bulk_product_schema.load([records[index] for index in positions])
+            validation_errors = {}
+        except ValidationError as err:
+            loaded = err.valid_data
+            validation_errors = err.messages
+        
+        # Build one upsert per valid record
+        now = datetime.utcnow()
+        operations = []
+        for position, index in enumerate(positions):
+            if position in validation_errors:
+                results[index] = {"index": index, "status": "invalid", "errors": validation_errors[position]}
+                continue
+            
+            data = loaded[position]
+            price = float(data['price'])
+            discount_percent = float(data['discount_percent'])
+            data['discount_price'] = price - (price * discount_percent / 100)
+            data['updated_at'] = now
+            if 'category_ids' in data:
+                data['category_ids'] = to_category_object_ids(data['category_ids'])
+            data['specs_numeric'] = derive_specs_numeric(data.get('specs'))
+            
+            operations.append((index, UpdateOne(
+                {"model": data['model']},
+                {"$set": data, "$setOnInsert": {"created_at": now}},
+                upsert=True
+            )))
+        
+        # Apply the upserts in batches
+        stopped = False
+        for start in range(0, len(operations), batch_size):
+            batch = operations[start:start + batch_size]
+            indexes = [index for index, _ in batch]
+            
+            if stopped:
+                for index in indexes:
+                    results[index] = {"index": index, "status": "skipped", "model": records[index].get('model')}
+                continue
+            
+            try:
+                result = products_collection.bulk_write([operation for _, operation in batch], ordered=ordered)
+                upserted = result.upserted_ids
+                write_errors = {}
+            except BulkWriteError as e:
+                upserted = {item['index']: item['_id'] for item in e.details.get('upserted', [])}
+                write_errors = {item['index']: item.get('errmsg', 'Write error') for item in e.details.get('writeErrors', [])}
+            
+            first_error = min(write_errors) if write_errors else None
+            for position, index in enumerate(indexes):
+                model = records[index].get('model')
+                if position in write_errors:
+                    results[index] = {"index": index, "status": "failed", "model": model, "errors": write_errors[position]}
+                elif ordered and first_error is not None and position > first_error:
+                    results[index] = {"index": index, "status": "skipped", "model": model}
+                elif position in upserted:
+                    results[index] = {"index": index, "status": "created", "model": model, "_id": str(upserted[position])}
+                else:
+                    results[index] = {"index": index, "status": "updated", "model": model}
+            
+            if ordered and write_errors:
+                stopped = True
+        
+        # Notify listeners about every product written by this import
+        written_models = [result['model'] for result in results if result['status'] in ('created', 'updated')]
+        if written_models:
+            catalog_events.products_changed({"model": {"$in": written_models}})
+        
+        summary = {"received": len(records)}
+        for status in ('created', 'updated', 'invalid', 'failed', 'skipped'):
+            summary[status] = sum(1 for result in results if result['status'] == status)
+        
+        return {"summary": summary, "results": results}
+
+@product_ns.route('/batch')
+class ProductBatch(Resource):
+    @product_ns.doc('get_products_batch')
+    @product_ns.expect(product_batch_parser)
+    @product_ns.response(200, 'Success')
+    @product_ns.response(400, 'Invalid request')
+    def get(self):
+        """Get several products by ID with a single query, in request order"""
+        args = product_batch_parser.parse_args()
+        
+        ids = [product_id.strip() for product_id in args.ids.split(',') if product_id.strip()]
+        if not ids:
+            return {"message": "At least one product ID is required"}, 400
+        if len(ids) > MAX_BATCH_IDS:
+            return {"message": f"At most {MAX_BATCH_IDS} product IDs can be requested at once"}, 400
+        
+        try:
+            projection = build_projection(args.fields, PRODUCT_FIELD_PATHS)
+        except InvalidFields as e:
+            return {"message": str(e)}, 400
+        
+        # Resolve full documents from the cache first (reading their stock in one query), then query the rest in one round trip
+        found = {}
+        to_fetch = set()
+        for product_id in ids:
+            if not is_valid_object_id(product_id):
+                continue
+            key = str(ObjectId(product_id))
+            if key in found or key in to_fetch:
+                continue
+            cached_product = product_cache.get(key) if projection is None else None
+            if cached_product is not None:
+                found[key] = cached_product
+            else:
+                to_fetch.add(key)
+        
+        if found:
+            found = {product['_id']: product for product in with_current_stock(products_collection, list(found.values()))}
+        if to_fetch:
+            object_ids = [ObjectId(key) for key in to_fetch]
+            for product in products_collection.find({"_id": {"$in": object_ids}}, projection):
+                product = format_product(product)
+                found[product['_id']] = product
+                if projection is None:
+                    product_cache.set(product['_id'], without_stock(product))
+        
+        results = []
+        for product_id in ids:
+            if not is_valid_object_id(product_id):
+                results.append({"id": product_id, "found": False, "error": "Invalid product ID format"})
+                continue
+            product = found.get(str(ObjectId(product_id)))
+            if product is None:
+                results.append({"id": product_id, "found": False, "error": "Product not found"})
+            else:
+                results.append({"id": product_id, "found": True, "product": product})
+        
+        return {"results": results}
+
+@product_ns.route('/cache-stats')
+class ProductCacheStats(Resource):
+    @product_ns.doc('get_cache_stats')
+    @product_ns.response(200, 'Success')
+    def get(self):
+        """Get hit/miss counters of the in-process caches"""
+        return cache_stats()
+
 @product_ns.route('/files/<file_id>')
 @product_ns.param('file_id', 'The file identifier in GridFS')
 class ProductFile(Resource):
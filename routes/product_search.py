@@ -1,12 +1,77 @@
-from flask import request, jsonify
+from flask import request, jsonify, Response
 from flask_restx import Namespace, Resource, fields, reqparse
 from bson import ObjectId
 from database import products_collection, categories_collection
-from utils.mongo_utils import format_product
+from utils.mongo_utils import format_product, to_category_object_ids
+from utils.text_index import ProductTextIndex
+from utils.columnar import ProductColumnarCatalog, COLUMNAR_AVAILABLE
+from utils.suggest import ProductSuggestIndex
+from utils.cache import get_cache
+from utils.stock import without_stock, with_current_stock
+from utils.catalog_version import catalog_version, VersionedSnapshot
+from utils import catalog_events
+from utils.projection import build_projection, InvalidFields
+from routes.product_routes import PRODUCT_FIELD_PATHS
+from utils.streaming import wants_ndjson, stream_ndjson, STREAM_BATCH_SIZE
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter, keyset_sort, get_sort_value, InvalidCursor
+import os
 
 # Create namespace
 search_ns = Namespace('product-search', description='Product search operations')
 
+# Fields matched by the text query, and the spec fields with their own search terms
+TEXT_QUERY_FIELDS = ('name', 'brand', 'model')
+SPEC_SEARCH_FIELDS = ('cpu', 'ram', 'storage', 'gpu')
+
+# Range filters on numeric spec attributes: parameter suffix -> specs_numeric field
+SPEC_RANGE_FILTERS = {
+    'ram': 'ram_gb',
+    'storage': 'storage_gb',
+    'display': 'display_inches',
+    'battery': 'battery_wh',
+    'gpu_vram': 'gpu_vram_gb'
+}
+
+# Fields scored by sort_by=relevance and their BM25 weights
+RELEVANCE_FIELD_WEIGHTS = {
+    'name': 3.0,
+    'brand': 2.0,
+    'model': 2.0,
+    'highlights': 1.0,
+    'short_description': 1.0
+}
+
+# Inverted index used for text and spec search and relevance ranking
+# (SEARCH_ENGINE=regex falls back to $regex queries for matching)
+USE_TEXT_INDEX = os.getenv('SEARCH_ENGINE', 'index').lower() != 'regex'
+product_text_index = ProductTextIndex(
+    products_collection,
+    TEXT_QUERY_FIELDS + tuple(f'specs.{field}' for field in SPEC_SEARCH_FIELDS) + ('highlights', 'short_description'),
+    catalog_version,
+    refresh_seconds=int(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', '300'))
+)
+catalog_events.subscribe('product_saved', product_text_index.on_product_saved)
+catalog_events.subscribe('product_deleted', product_text_index.on_product_deleted)
+catalog_events.subscribe('products_changed', product_text_index.add_matching)
+catalog_events.subscribe('category_changed', product_text_index.on_category_changed)
+
+# Optional in-process columnar engine for structured searches (requires numpy)
+USE_COLUMNAR = os.getenv('SEARCH_COLUMNAR', 'false').lower() in ('1', 'true', 'yes')
+if USE_COLUMNAR and not COLUMNAR_AVAILABLE:
+    print("SEARCH_COLUMNAR is enabled but numpy is not installed; using MongoDB for structured search")
+    USE_COLUMNAR = False
+columnar_catalog = None
+if USE_COLUMNAR:
+    columnar_catalog = ProductColumnarCatalog(
+        products_collection,
+        catalog_version,
+        refresh_seconds=int(os.getenv('SEARCH_COLUMNAR_REFRESH_SECONDS', '300'))
+    )
+    catalog_events.subscribe('product_saved', columnar_catalog.on_product_saved)
+    catalog_events.subscribe('product_deleted', columnar_catalog.on_product_deleted)
+    catalog_events.subscribe('products_changed', columnar_catalog.add_matching)
+    catalog_events.subscribe('category_changed', columnar_catalog.on_category_changed)
+
 # Create search parser
 search_parser = reqparse.RequestParser()
 search_parser.add_argument('query', type=str, required=False, help='Text search query', location='args')
@@ -21,17 +86,43 @@ search_parser.add_argument('cpu', type=str, required=False, help='CPU search ter
 search_parser.add_argument('ram', type=str, required=False, help='RAM search term', location='args')
 search_parser.add_argument('storage', type=str, required=False, help='Storage search term', location='args')
 search_parser.add_argument('gpu', type=str, required=False, help='GPU search term', location='args')
+for name, field in SPEC_RANGE_FILTERS.items():
+    search_parser.add_argument(f'min_{name}', type=float, required=False, help=f'Minimum specs_numeric.{field}', location='args')
+    search_parser.add_argument(f'max_{name}', type=float, required=False, help=f'Maximum specs_numeric.{field}', location='args')
 search_parser.add_argument('sort_by', type=str, required=False, 
-                          help='Sort field (price, discount_price, discount_percent, created_at)', 
+                          help='Sort field (price, discount_price, discount_percent, created_at, relevance)', 
                           location='args', 
-                          choices=['price', 'discount_price', 'discount_percent', 'created_at'])
+                          choices=['price', 'discount_price', 'discount_percent', 'created_at', 'relevance'])
 search_parser.add_argument('sort_order', type=str, required=False, 
                           help='Sort order (asc, desc)',
                           location='args',
                           default='asc',
                           choices=['asc', 'desc'])
 search_parser.add_argument('page', type=int, required=False, help='Page number', location='args', default=1)
+search_parser.add_argument('search_after', type=str, required=False,
+                          help='Cursor returned as next_cursor by the previous page; replaces page for deep pagination',
+                          location='args')
 search_parser.add_argument('limit', type=int, required=False, help='Items per page', location='args', default=10)
+search_parser.add_argument('count', type=str, required=False,
+                          help='How to compute total: exact (default), estimate (capped count) or none (skip counting)',
+                          location='args',
+                          default='exact',
+                          choices=['exact', 'estimate', 'none'])
+search_parser.add_argument('fields', type=str, required=False, help='Comma-separated list of fields to return (e.g. name,thumbnail,price)', location='args')
+
+# Parser for facet counts: the search filters without paging, sorting and output options
+facets_parser = search_parser.copy()
+for argument_name in ('sort_by', 'sort_order', 'page', 'search_after', 'limit', 'count', 'fields'):
+    facets_parser.remove_argument(argument_name)
+facets_parser.add_argument('facet_limit', type=int, required=False, help='Maximum values returned per facet', location='args', default=50)
+
+# Parser for typeahead suggestions
+suggest_parser = reqparse.RequestParser()
+suggest_parser.add_argument('q', type=str, required=True, help='Text typed so far', location='args')
+suggest_parser.add_argument('limit', type=int, required=False, help='Maximum number of suggestions (max 20)', location='args', default=10)
+
+# Arguments that filter the searched products
+SEARCH_FILTER_ARGUMENTS = tuple(argument.name for argument in facets_parser.args if argument.name != 'facet_limit')
 
 # Response model for search results
 product_model = search_ns.model('Product', {
@@ -43,6 +134,7 @@ product_model = search_ns.model('Product', {
     'discount_percent': fields.Integer(description='Discount percentage'),
     'discount_price': fields.Integer(description='Price after discount'),
     'specs': fields.Raw(description='Product specifications'),
+    'specs_numeric': fields.Raw(description='Numeric attributes derived from specs'),
     'stock_quantity': fields.Integer(description='Available stock'),
     'category_ids': fields.List(fields.String, description='Category IDs'),
     'thumbnail': fields.String(description='Thumbnail file ID'),
@@ -52,13 +144,344 @@ product_model = search_ns.model('Product', {
 })
 
 pagination_model = search_ns.model('PaginatedResult', {
-    'total': fields.Integer(description='Total number of items'),
-    'page': fields.Integer(description='Current page number'),
+    'total': fields.Integer(description='Total number of items (null when count=none)'),
+    'total_is_estimate': fields.Boolean(description='True when total is a lower bound (count=estimate)'),
+    'has_more': fields.Boolean(description='Whether more pages follow this one'),
+    'page': fields.Integer(description='Current page number (null when paging with search_after)'),
     'limit': fields.Integer(description='Items per page'),
-    'pages': fields.Integer(description='Total number of pages'),
+    'pages': fields.Integer(description='Total number of pages (null when count=none)'),
+    'next_cursor': fields.String(description='Pass as search_after to get the next page (null on the last page and with sort_by=relevance)'),
     'products': fields.List(fields.Nested(product_model), description='List of products')
 })
 
+def build_search_query(args):
+    """Build the MongoDB filter for parsed search_parser arguments"""
+    # Build the query
+    query = {}
+    
+    # Text search (across name, brand, model) and spec search terms
+    text_clauses = []
+    if args.query:
+        text_clauses.append((TEXT_QUERY_FIELDS, args.query))
+    for field in SPEC_SEARCH_FIELDS:
+        if args.get(field):
+            text_clauses.append(((f'specs.{field}',), args.get(field)))
+    
+    if text_clauses and USE_TEXT_INDEX:
+        # Resolve the text part in memory and hand MongoDB the matching IDs
+        text_index, _ = product_text_index.get()
+        matched_ids = text_index.match(text_clauses)
+        if matched_ids is not None:
+            query['_id'] = {'$in': [ObjectId(product_id) for product_id in matched_ids]}
+    elif args.query:
+        query['$or'] = [
+            {'name': {'$regex': args.query, '$options': 'i'}},
+            {'brand': {'$regex': args.query, '$options': 'i'}},
+            {'model': {'$regex': args.query, '$options': 'i'}}
+        ]
+    
+    # Price range filter
+    price_filter = {}
+    if args.min_price:
+        price_filter['$gte'] = args.min_price
+    if args.max_price:
+        price_filter['$lte'] = args.max_price
+    if price_filter:
+        query['price'] = price_filter
+    
+    # Discount range filter
+    discount_filter = {}
+    if args.min_discount:
+        discount_filter['$gte'] = args.min_discount
+    if args.max_discount:
+        discount_filter['$lte'] = args.max_discount
+    if discount_filter:
+        query['discount_percent'] = discount_filter
+    
+    # Brand filter
+    if args.brands:
+        brands = [brand.strip() for brand in args.brands.split(',')]
+        query['brand'] = {'$in': brands}
+    
+    # Category filter. Category IDs are stored as ObjectIds, so a single $in
+    # can use the category_ids indexes.
+    if args.category_ids:
+        query['category_ids'] = {'$in': to_category_object_ids(args.category_ids.split(','))}
+    
+    # Status filter
+    if args.status:
+        statuses = [status.strip() for status in args.status.split(',')]
+        query['status'] = {'$in': statuses}
+    
+    # Numeric spec ranges, served by the specs_numeric indexes
+    for name, field in SPEC_RANGE_FILTERS.items():
+        range_filter = {}
+        if args.get(f'min_{name}') is not None:
+            range_filter['$gte'] = args.get(f'min_{name}')
+        if args.get(f'max_{name}') is not None:
+            range_filter['$lte'] = args.get(f'max_{name}')
+        if range_filter:
+            query[f'specs_numeric.{field}'] = range_filter
+    
+    # Specs filters (resolved by the text index unless it is disabled)
+    if not USE_TEXT_INDEX:
+        for field in SPEC_SEARCH_FIELDS:
+            if args.get(field):
+                query[f'specs.{field}'] = {'$regex': args.get(field), '$options': 'i'}
+    
+    return query
+
+def uses_text_index(args):
+    """Whether the text and spec terms of a request are resolved by the text index"""
+    return USE_TEXT_INDEX and (bool(args.query) or any(args.get(field) for field in SPEC_SEARCH_FIELDS))
+
+def served_catalog_version(text_index=False, columnar=False):
+    """Catalog version a request is answered at.
+
+    The in-memory indexes keep serving their previous snapshot while a newer
+    one is built, so requests resolved by them are cached under the version
+    of that snapshot rather than the current catalog version.
+    """
+    versions = [catalog_version.current()]
+    if text_index:
+        versions.append(product_text_index.get()[1])
+    if columnar:
+        versions.append(columnar_catalog.get()[1])
+    return min(versions)
+
+# Filtered counts stop at this many documents when count=estimate
+COUNT_ESTIMATE_CAP = int(os.getenv('SEARCH_COUNT_ESTIMATE_CAP', '1000'))
+
+def count_search_results(query, count_mode):
+    """Count matching products on their own. Returns (total, total_is_estimate)."""
+    if count_mode == 'none':
+        return None, False
+    if count_mode == 'estimate':
+        if not query:
+            return products_collection.estimated_document_count(), True
+        total = products_collection.count_documents(query, limit=COUNT_ESTIMATE_CAP)
+        return total, total >= COUNT_ESTIMATE_CAP
+    return products_collection.count_documents(query), False
+
+def execute_columnar_search(query, sort_criteria, skip, limit, projection, count_mode):
+    """Select the page from the columnar snapshot and read only its documents.
+
+    Returns the same tuple as execute_search, or None when the query or sort
+    is not supported by the snapshot. The count is always exact.
+    """
+    catalog, _ = columnar_catalog.get()
+    sort_field, sort_order = sort_criteria[0]
+    result = catalog.search(query, sort_field, sort_order, skip, limit)
+    if result is None:
+        return None
+    
+    page_ids, total = result
+    documents = {document['_id']: document
+                 for document in products_collection.find({'_id': {'$in': page_ids}}, projection)}
+    products = [documents[product_id] for product_id in page_ids if product_id in documents]
+    has_more = skip + len(page_ids) < total
+    if count_mode == 'none':
+        total = None
+    return products, total, False, has_more
+
+def execute_relevance_search(query, text, skip, limit, projection, count_mode):
+    """Fetch one page of search results ranked by BM25 relevance to `text`.
+
+    MongoDB returns the IDs of every product matching the filters; the text
+    index scores them and keeps the best skip + limit in a bounded heap, and
+    only the page's documents are read. The count is always exact.
+
+    Returns (products, total, total_is_estimate, has_more).
+    """
+    text_index, _ = product_text_index.get()
+    candidates = [document['_id'] for document in products_collection.find(query, {'_id': 1})]
+    ranked = text_index.rank(text, RELEVANCE_FIELD_WEIGHTS, candidates, skip + limit)
+    page_ids = [ObjectId(product_id) for product_id, _ in ranked[skip:skip + limit]]
+    
+    documents = {document['_id']: document
+                 for document in products_collection.find({'_id': {'$in': page_ids}}, projection)}
+    products = [documents[product_id] for product_id in page_ids if product_id in documents]
+    total = len(candidates)
+    has_more = skip + len(page_ids) < total
+    return products, total if count_mode != 'none' else None, False, has_more
+
+def execute_keyset_search(query, cursor_filter, sort_criteria, limit, projection, count_mode):
+    """Fetch the page after a search_after cursor.
+
+    The cursor filter selects products strictly after the last (sort key, _id)
+    of the previous page, so the cost does not depend on how deep the page is.
+    The total counts every product matching `query`.
+
+    Returns (products, total, total_is_estimate, has_more).
+    """
+    total, total_is_estimate = count_search_results(query, count_mode)
+    page_query = {'$and': [query, cursor_filter]} if query else cursor_filter
+    products = list(products_collection.find(page_query, projection).sort(sort_criteria).limit(limit + 1))
+    return products[:limit], total, total_is_estimate, len(products) > limit
+
+def execute_search(query, sort_criteria, skip, limit, projection, count_mode):
+    """Fetch one page of search results together with the total in a single round trip.
+
+    The page and the count are computed by one $facet aggregation. The $sort is
+    placed before $facet so it can still be served by an index. With
+    count=estimate the count branch stops after COUNT_ESTIMATE_CAP documents; with
+    count=none no count is computed and one extra document tells whether more
+    pages exist.
+
+    Filter-only searches are served by the columnar engine when it is enabled.
+
+    Returns (products, total, total_is_estimate, has_more).
+    """
+    if columnar_catalog is not None:
+        result = execute_columnar_search(query, sort_criteria, skip, limit, projection, count_mode)
+        if result is not None:
+            return result
+    
+    if count_mode == 'none':
+        cursor = products_collection.find(query, projection).sort(sort_criteria).skip(skip).limit(limit + 1)
+        products = list(cursor)
+        return products[:limit], None, False, len(products) > limit
+    
+    if count_mode == 'estimate' and not query:
+        # Collection metadata is enough when nothing is filtered
+        total = products_collection.estimated_document_count()
+        products = list(products_collection.find(query, projection).sort(sort_criteria).skip(skip).limit(limit))
+        return products, total, True, skip + len(products) < total
+    
+    page_stages = [{'$skip': skip}, {'$limit': limit}]
+    if projection:
+        page_stages.append({'$project': projection})
+    
+    count_stages = [{'$count': 'total'}]
+    if count_mode == 'estimate':
+        count_stages.insert(0, {'$limit': COUNT_ESTIMATE_CAP})
+    
+    pipeline = [
+        {'$match': query},
+        {'$sort': dict(sort_criteria)},
+        {'$facet': {'products': page_stages, 'total': count_stages}}
+    ]
+    result = next(products_collection.aggregate(pipeline, allowDiskUse=True), None) or {}
+    
+    products = result.get('products', [])
+    total = result['total'][0]['total'] if result.get('total') else 0
+    total_is_estimate = count_mode == 'estimate' and total >= COUNT_ESTIMATE_CAP
+    
+    # A capped count says nothing about pages past the cap, so rely on the page being full
+    has_more = skip + len(products) < total or (total_is_estimate and len(products) == limit)
+    return products, total, total_is_estimate, has_more
+
+# Search arguments holding comma-separated lists
+LIST_ARGUMENTS = ('brands', 'status', 'category_ids')
+
+def normalize_search_args(args, names):
+    """Build a hashable, order-independent key from parsed search arguments.
+
+    Empty arguments are dropped, comma-separated lists are de-duplicated and
+    sorted, and text terms are stripped and lowercased (matching is case-insensitive).
+    """
+    items = []
+    for name in names:
+        value = args.get(name)
+        if value is None or value == '':
+            continue
+        if name in LIST_ARGUMENTS:
+            value = tuple(sorted({item.strip() for item in value.split(',') if item.strip()}))
+            if not value:
+                continue
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        items.append((name, value))
+    return tuple(items)
+
+# Facets computed by /facets: output name -> product field
+FACET_FIELDS = {
+    'brand': 'brand',
+    'status': 'status',
+    'categories': 'category_ids',
+    'cpu': 'specs.cpu',
+    'ram': 'specs.ram',
+    'storage': 'specs.storage',
+    'gpu': 'specs.gpu',
+    'display': 'specs.display',
+    'os': 'specs.os'
+}
+
+# Facets whose own selection is left out of their counts, so the sidebar keeps
+# showing the alternatives to what is already selected
+SELECTION_FACETS = {'brand': 'brands', 'status': 'status', 'categories': 'category_ids'}
+
+# Caches of search pages and facet counts. Keys start with the catalog
+# version they were answered at, so every product or category write
+# invalidates them at once. Orders
+# change stock without bumping the version, so cached pages leave stock out
+# and it is read again whenever a page is served.
+search_cache = get_cache(
+    'search_results',
+    maxsize=int(os.getenv('SEARCH_CACHE_SIZE', '2000')),
+    ttl=int(os.getenv('SEARCH_CACHE_TTL', '300'))
+)
+facet_cache = get_cache(
+    'search_facets',
+    maxsize=int(os.getenv('FACET_CACHE_SIZE', '500')),
+    ttl=int(os.getenv('FACET_CACHE_TTL', '300'))
+)
+
+def compute_facets(args, facet_limit):
+    """Count products per facet value for the current filters with one $facet aggregation"""
+    # Filters shared by every facet, and the selection filters applied per facet
+    base_args = reqparse.ParseResult(
+        {name: None if name in LIST_ARGUMENTS else value for name, value in args.items()}
+    )
+    base_query = build_search_query(base_args)
+    selection_queries = {
+        argument: build_search_query(reqparse.ParseResult(
+            {name: value if name == argument else None for name, value in args.items()}
+        ))
+        for argument in LIST_ARGUMENTS
+    }
+    
+    def selection_match(excluded_argument=None):
+        conditions = [query for argument, query in selection_queries.items() if query and argument != excluded_argument]
+        if not conditions:
+            return {}
+        return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+    
+    facets = {}
+    for name, field in FACET_FIELDS.items():
+        stages = [{'$match': selection_match(SELECTION_FACETS.get(name))}]
+        if field == 'category_ids':
+            stages.append({'$unwind': '$category_ids'})
+        stages += [
+            {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+            {'$match': {'_id': {'$ne': None}}},
+            {'$sort': {'count': -1, '_id': 1}},
+            {'$limit': facet_limit}
+        ]
+        facets[name] = stages
+    facets['total'] = [{'$match': selection_match()}, {'$count': 'total'}]
+    
+    pipeline = [{'$match': base_query}, {'$facet': facets}]
+    result = next(products_collection.aggregate(pipeline, allowDiskUse=True), None) or {}
+    
+    response = {'total': result['total'][0]['total'] if result.get('total') else 0, 'facets': {}}
+    for name in FACET_FIELDS:
+        response['facets'][name] = [
+            {'value': str(bucket['_id']) if isinstance(bucket['_id'], ObjectId) else bucket['_id'], 'count': bucket['count']}
+            for bucket in result.get(name, [])
+        ]
+    
+    # Add category names
+    category_buckets = response['facets']['categories']
+    category_ids = [ObjectId(bucket['value']) for bucket in category_buckets if ObjectId.is_valid(bucket['value'])]
+    if category_ids:
+        names = {str(category['_id']): category.get('name')
+                 for category in categories_collection.find({'_id': {'$in': category_ids}}, {'name': 1})}
+        for bucket in category_buckets:
+            bucket['name'] = names.get(bucket['value'])
+    
+    return response
+
 # Search API endpoints
 @search_ns.route('/')
 class ProductSearch(Resource):
@@ -69,136 +492,201 @@ class ProductSearch(Resource):
         """Search products with filters"""
         args = search_parser.parse_args()
         
-        # Build the query
-        query = {}
-        
-        # Text search (across name, brand, model)
-        if args.query:
-            query['$or'] = [
-                {'name': {'$regex': args.query, '$options': 'i'}},
-                {'brand': {'$regex': args.query, '$options': 'i'}},
-                {'model': {'$regex': args.query, '$options': 'i'}}
-            ]
-        
-        # Price range filter
-        price_filter = {}
-        if args.min_price:
-            price_filter['$gte'] = args.min_price
-        if args.max_price:
-            price_filter['$lte'] = args.max_price
-        if price_filter:
-            query['price'] = price_filter
-        
-        # Discount range filter
-        discount_filter = {}
-        if args.min_discount:
-            discount_filter['$gte'] = args.min_discount
-        if args.max_discount:
-            discount_filter['$lte'] = args.max_discount
-        if discount_filter:
-            query['discount_percent'] = discount_filter
-        
-        # Brand filter
-        if args.brands:
-            brands = [brand.strip() for brand in args.brands.split(',')]
-            query['brand'] = {'$in': brands}
-        
-        # Category filter
-        if args.category_ids:
-            try:
-                print(f"Category IDs received: {args.category_ids}")
-                # First try to convert to ObjectId, and if that fails, use as string
-                category_ids_obj = []
-                category_ids_str = []
-                
-                for cat_id in args.category_ids.split(','):
-                    cat_id = cat_id.strip()
-                    try:
-                        if ObjectId.is_valid(cat_id):
-                            # Keep both ObjectId and string version for query
-                            category_ids_obj.append(ObjectId(cat_id))
-                            category_ids_str.append(cat_id)
-                            print(f"Added valid ObjectId: {cat_id}")
-                        else:
-                            # If not a valid ObjectId, use as string (for test/dev environments)
-                            category_ids_str.append(cat_id)
-                            print(f"Using category ID as string: {cat_id}")
-                    except Exception as e:
-                        print(f"Error converting category ID {cat_id}: {str(e)}")
-                        # Keep the original ID as a fallback
-                        category_ids_str.append(cat_id)
-                
-                print(f"Looking for ObjectIds: {category_ids_obj}")
-                print(f"Looking for string IDs: {category_ids_str}")
-                
-                if category_ids_obj or category_ids_str:
-                    # Check for EITHER string IDs or ObjectIds
-                    or_conditions = []
-                    
-                    # Add ObjectId condition if we have any
-                    if category_ids_obj:
-                        or_conditions.append({'category_ids': {'$in': category_ids_obj}})
-                    
-                    # Add string ID condition if we have any
-                    if category_ids_str:
-                        or_conditions.append({'category_ids': {'$in': category_ids_str}})
-                    
-                    # Use $or to check both conditions
-                    if len(or_conditions) > 1:
-                        query['$or'] = or_conditions
-                    else:
-                        # Just one type of ID to check
-                        query['category_ids'] = {'$in': category_ids_obj or category_ids_str}
-                    
-                    print(f"Final query part for categories: {query.get('$or') or query.get('category_ids')}")
-            except Exception as e:
-                print(f"Error in category filter: {str(e)}")
-                # Don't add category filter if there's an error
-        
-        # Status filter
-        if args.status:
-            statuses = [status.strip() for status in args.status.split(',')]
-            query['status'] = {'$in': statuses}
-        
-        # Specs filters
-        specs_filter = {}
-        if args.cpu:
-            specs_filter['cpu'] = {'$regex': args.cpu, '$options': 'i'}
-        if args.ram:
-            specs_filter['ram'] = {'$regex': args.ram, '$options': 'i'}
-        if args.storage:
-            specs_filter['storage'] = {'$regex': args.storage, '$options': 'i'}
-        if args.gpu:
-            specs_filter['gpu'] = {'$regex': args.gpu, '$options': 'i'}
-        if specs_filter:
-            for key, value in specs_filter.items():
-                query[f'specs.{key}'] = value
+        try:
+            projection = build_projection(args.fields, PRODUCT_FIELD_PATHS)
+        except InvalidFields as e:
+            return {"message": str(e)}, 400
         
         # Pagination
         page = max(1, args.page)
         limit = max(1, min(100, args.limit))  # Limit between 1 and 100
         skip = (page - 1) * limit
         
-        # Sorting
+        # Sorting. Relevance needs a text query and is always best first; other
+        # sorts use _id as tie-breaker so search_after cursors are exact.
         sort_by = args.sort_by or 'created_at'
+        if sort_by == 'relevance' and not (args.query and args.query.strip()):
+            sort_by = 'created_at'
         sort_order = 1 if args.sort_order == 'asc' else -1
-        sort_criteria = [(sort_by, sort_order)]
+        if sort_by == 'relevance':
+            sort_order = -1
+        sort_criteria = keyset_sort(sort_by, sort_order)
+        
+        # Keyset pagination: search_after continues after the last product of the previous page
+        cursor_filter = None
+        if args.search_after:
+            if sort_by == 'relevance':
+                return {"message": "search_after cannot be combined with sort_by=relevance"}, 400
+            try:
+                sort_value, last_id = decode_cursor(args.search_after, sort_by)
+            except InvalidCursor as e:
+                return {"message": str(e)}, 400
+            cursor_filter = keyset_filter(sort_by, sort_value, last_id, sort_order)
+            page = None
+            skip = 0
+        
+        # Serve repeated searches from the cache until the catalog changes
+        ndjson = wants_ndjson()
+        cache_key = (
+            served_catalog_version(
+                text_index=uses_text_index(args) or sort_by == 'relevance',
+                columnar=columnar_catalog is not None and sort_by != 'relevance' and not cursor_filter
+            ),
+            normalize_search_args(args, SEARCH_FILTER_ARGUMENTS),
+            sort_by, sort_order, page, args.search_after, limit, args.count,
+            tuple(sorted(projection)) if projection else None
+        )
+        include_stock = not projection or 'stock_quantity' in projection
+        if not ndjson:
+            cached_response = search_cache.get(cache_key)
+            if cached_response is not None:
+                if include_stock:
+                    return dict(cached_response, products=with_current_stock(products_collection, cached_response['products']))
+                return cached_response
+        
+        try:
+            query = build_search_query(args)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        
+        # Stream NDJSON when requested, with pagination info in the headers
+        if ndjson:
+            if sort_by == 'relevance':
+                products, total, _, _ = execute_relevance_search(query, args.query, skip, limit, projection, args.count)
+            else:
+                total, total_is_estimate = count_search_results(query, args.count)
+                page_query = query
+                if cursor_filter:
+                    page_query = {'$and': [query, cursor_filter]} if query else cursor_filter
+                products = products_collection.find(page_query, projection).sort(sort_criteria).skip(skip).limit(limit)
+                products = products.batch_size(STREAM_BATCH_SIZE)
+            headers = {'X-Limit': str(limit)}
+            if page is not None:
+                headers['X-Page'] = str(page)
+            if total is not None:
+                headers['X-Total-Count'] = str(total)
+                headers['X-Pages'] = str((total + limit - 1) // limit)
+            return stream_ndjson(products, format_product, headers=headers)
+        
+        # The sort key is always fetched so the next cursor can be built, and dropped afterwards
+        strip_sort_field = bool(projection) and sort_by != 'relevance' and sort_by not in projection
+        page_projection = dict(projection, **{sort_by: 1}) if strip_sort_field else projection
         
         # Execute query
-        total = products_collection.count_documents(query)
-        products_cursor = products_collection.find(query).skip(skip).limit(limit).sort(sort_criteria)
-        products = [format_product(product) for product in products_cursor]
+        if sort_by == 'relevance':
+            products, total, total_is_estimate, has_more = execute_relevance_search(
+                query, args.query, skip, limit, projection, args.count
+            )
+        elif cursor_filter:
+            products, total, total_is_estimate, has_more = execute_keyset_search(
+                query, cursor_filter, sort_criteria, limit, page_projection, args.count
+            )
+        else:
+            products, total, total_is_estimate, has_more = execute_search(
+                query, sort_criteria, skip, limit, page_projection, args.count
+            )
         
-        # Calculate total pages
-        total_pages = (total + limit - 1) // limit
+        next_cursor = None
+        if has_more and products and sort_by != 'relevance':
+            last = products[-1]
+            next_cursor = encode_cursor(sort_by, get_sort_value(last, sort_by), last['_id'])
+        if strip_sort_field:
+            for product in products:
+                product.pop(sort_by, None)
         
         # Return paginated results
-        return {
+        response = {
             'total': total,
+            'total_is_estimate': total_is_estimate,
+            'has_more': has_more,
             'page': page,
             'limit': limit,
-            'pages': total_pages,
-            'products': products
+            'pages': (total + limit - 1) // limit if total is not None else None,
+            'next_cursor': next_cursor,
+            'products': [format_product(product) for product in products]
+        }
+        search_cache.set(cache_key, dict(response, products=[without_stock(product) for product in response['products']]))
+        return response
+
+@search_ns.route('/facets')
+class SearchFacets(Resource):
+    @search_ns.doc('get_search_facets')
+    @search_ns.expect(facets_parser)
+    @search_ns.response(200, 'Success')
+    def get(self):
+        """Get per-value product counts for the filter sidebar, narrowed by the current filters"""
+        args = facets_parser.parse_args()
+        facet_limit = max(1, min(200, args.facet_limit))
+        cache_key = (served_catalog_version(text_index=uses_text_index(args)),
+                     normalize_search_args(args, SEARCH_FILTER_ARGUMENTS), facet_limit)
+        cached_facets = facet_cache.get(cache_key)
+        if cached_facets is not None:
+            return cached_facets
+        
+        try:
+            response = compute_facets(args, facet_limit)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        facet_cache.set(cache_key, response)
+        return response
+
+# Suggestion type -> product field it is taken from
+SUGGEST_FIELDS = {
+    'name': 'name',
+    'brand': 'brand',
+    'model': 'model',
+    'cpu': 'specs.cpu',
+    'ram': 'specs.ram',
+    'storage': 'specs.storage',
+    'gpu': 'specs.gpu',
+    'display': 'specs.display',
+    'os': 'specs.os'
+}
+MAX_SUGGESTIONS = 20
+
+# Loaded on first use and updated on every product write through the API
+product_suggest_index = ProductSuggestIndex(
+    products_collection,
+    SUGGEST_FIELDS,
+    catalog_version,
+    max_limit=MAX_SUGGESTIONS,
+    refresh_seconds=int(os.getenv('SUGGEST_INDEX_REFRESH_SECONDS', '300'))
+)
+catalog_events.subscribe('product_saved', product_suggest_index.on_product_saved)
+catalog_events.subscribe('product_deleted', product_suggest_index.on_product_deleted)
+catalog_events.subscribe('products_changed', product_suggest_index.add_matching)
+catalog_events.subscribe('category_changed', product_suggest_index.on_category_changed)
+
+@search_ns.route('/suggest')
+class SearchSuggest(Resource):
+    @search_ns.doc('suggest_products')
+    @search_ns.expect(suggest_parser)
+    @search_ns.response(200, 'Success')
+    def get(self):
+        """Get typeahead suggestions for product names, brands, models and spec values"""
+        args = suggest_parser.parse_args()
+        limit = max(1, min(MAX_SUGGESTIONS, args.limit))
+        
+        suggest_index, _ = product_suggest_index.get()
+        suggestions = suggest_index.suggest(args.q, limit)
+        return {
+            'query': args.q,
+            'suggestions': [
+                {'text': entry['text'], 'type': entry['type'], 'count': entry['count']}
+                for entry in suggestions
+            ]
+        }
+
+@search_ns.route('/cache-stats')
+class SearchCacheStats(Resource):
+    @search_ns.doc('get_search_cache_stats')
+    @search_ns.response(200, 'Success')
+    def get(self):
+        """Get the catalog version and the hit/miss counters of the search caches"""
+        return {
+            'catalog_version': catalog_version.current(),
+            'search_results': search_cache.stats(),
+            'search_facets': facet_cache.stats()
         }
 
 @search_ns.route('/brands')
@@ -210,50 +698,69 @@ class BrandList(Resource):
         brands = products_collection.distinct('brand')
         return {'brands': brands}
 
+def compute_price_range():
+    """Min and max product price in one aggregation"""
+    result = next(products_collection.aggregate([
+        {'$group': {'_id': None, 'min_price': {'$min': '$price'}, 'max_price': {'$max': '$price'}}}
+    ]), None)
+    
+    return {
+        'min_price': result['min_price'] if result and result['min_price'] is not None else 0,
+        'max_price': result['max_price'] if result and result['max_price'] is not None else 0
+    }
+
+# Specs fields listed by /filter-options
+FILTER_OPTION_SPECS = ('cpu', 'ram', 'storage', 'gpu', 'display', 'os')
+
+def compute_filter_options():
+    """Distinct specs values and statuses in one aggregation, plus the category list"""
+    group = {'_id': None, 'status': {'$addToSet': '$status'}}
+    for field in FILTER_OPTION_SPECS:
+        group[field] = {'$addToSet': f'$specs.{field}'}
+    result = next(products_collection.aggregate([{'$group': group}], allowDiskUse=True), None) or {}
+    
+    def sorted_values(name):
+        return sorted((value for value in result.get(name, []) if value is not None), key=str)
+    
+    # Get all categories with names
+    categories = list(categories_collection.find({}, {'_id': 1, 'name': 1}))
+    category_options = [{'id': str(cat['_id']), 'name': cat['name']} for cat in categories]
+    
+    return {
+        'specs': {field: sorted_values(field) for field in FILTER_OPTION_SPECS},
+        'status': sorted_values('status'),
+        'categories': category_options
+    }
+
+# Snapshots recomputed only after a product or category write
+price_range_snapshot = VersionedSnapshot(compute_price_range, catalog_version)
+filter_options_snapshot = VersionedSnapshot(compute_filter_options, catalog_version)
+
+def snapshot_response(snapshot, name):
+    """Serve a snapshot with an ETag derived from the catalog version, answering 304 when unchanged"""
+    etag = f'{name}-{catalog_version.current()}'
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    
+    value, version = snapshot.get()
+    headers['ETag'] = f'"{name}-{version}"'
+    return value, 200, headers
+
 @search_ns.route('/price-range')
 class PriceRange(Resource):
     @search_ns.doc('get_price_range')
     @search_ns.response(200, 'Success')
+    @search_ns.response(304, 'Not modified')
     def get(self):
         """Get min and max prices available for filtering"""
-        min_price = products_collection.find_one({}, sort=[('price', 1)])
-        max_price = products_collection.find_one({}, sort=[('price', -1)])
-        
-        return {
-            'min_price': min_price['price'] if min_price else 0,
-            'max_price': max_price['price'] if max_price else 0
-        }
+        return snapshot_response(price_range_snapshot, 'price-range')
 
 @search_ns.route('/filter-options')
 class FilterOptions(Resource):
     @search_ns.doc('get_filter_options')
     @search_ns.response(200, 'Success')
+    @search_ns.response(304, 'Not modified')
     def get(self):
         """Get all available filter options for specs fields"""
-        # Get all unique values for each specs field
-        cpu_options = products_collection.distinct('specs.cpu')
-        ram_options = products_collection.distinct('specs.ram')
-        storage_options = products_collection.distinct('specs.storage')
-        gpu_options = products_collection.distinct('specs.gpu')
-        display_options = products_collection.distinct('specs.display')
-        os_options = products_collection.distinct('specs.os')
-        
-        # Get all statuses
-        status_options = products_collection.distinct('status')
-        
-        # Get all categories with names
-        categories = list(categories_collection.find({}, {'_id': 1, 'name': 1}))
-        category_options = [{'id': str(cat['_id']), 'name': cat['name']} for cat in categories]
-        
-        return {
-            'specs': {
-                'cpu': cpu_options,
-                'ram': ram_options,
-                'storage': storage_options,
-                'gpu': gpu_options,
-                'display': display_options,
-                'os': os_options
-            },
-            'status': status_options,
-            'categories': category_options
-        } 
\ No newline at end of file
+        return snapshot_response(filter_options_snapshot, 'filter-options')
@@ -0,0 +1,94 @@
+from flask_restx import Namespace, Resource, fields
+from datetime import datetime
+from database import sales_rollups_collection
+from utils.sales_rollups import DIMENSIONS
+from utils.auth import is_admin_request, ADMIN_KEY_HEADER
+
+# Create namespace for sales reporting
+sales_ns = Namespace('sales', description='Sales reporting')
+
+sales_rollup_model = sales_ns.model('SalesRollup', {
+    'day': fields.String(description='Day (YYYY-MM-DD)'),
+    'dimension': fields.String(description='Rollup dimension', enum=list(DIMENSIONS)),
+    'key': fields.String(description='Product ID, brand, or "all" for day totals'),
+    'name': fields.String(description='Product name or brand'),
+    'revenue': fields.Float(description='Revenue (order totals for days, item subtotals for products and brands)'),
+    'orders': fields.Integer(description='Number of orders'),
+    'units': fields.Integer(description='Units sold')
+})
+
+sales_rollups_response_model = sales_ns.model('SalesRollupsResponse', {
+    'rollups': fields.List(fields.Nested(sales_rollup_model)),
+    'count': fields.Integer(description='Number of rollups returned'),
+    'truncated': fields.Boolean(description='True when more rollups matched than the limit')
+})
+
+DEFAULT_ROLLUP_LIMIT = 1000
+MAX_ROLLUP_LIMIT = 5000
+
+# Query parameters for reading rollups
+sales_rollups_parser = sales_ns.parser()
+sales_rollups_parser.add_argument('dimension', type=str, required=False, location='args', default='day',
+                                  choices=list(DIMENSIONS), help='Rollup dimension (day, product, brand)')
+sales_rollups_parser.add_argument('date_from', type=str, required=False, location='args',
+                                  help='First day (YYYY-MM-DD)')
+sales_rollups_parser.add_argument('date_to', type=str, required=False, location='args',
+                                  help='Last day (YYYY-MM-DD)')
+sales_rollups_parser.add_argument('key', type=str, required=False, location='args',
+                                  help='Comma-separated product IDs or brands')
+sales_rollups_parser.add_argument('limit', type=int, required=False, location='args', default=DEFAULT_ROLLUP_LIMIT,
+                                  help=f'Maximum number of rollups (max {MAX_ROLLUP_LIMIT})')
+
+def parse_day(value):
+    """Validate a YYYY-MM-DD day. Raises ValueError for invalid values."""
+    value = value.strip()
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid day: {value}")
+    return value
+
+@sales_ns.route('/rollups')
+class SalesRollups(Resource):
+    @sales_ns.expect(sales_rollups_parser)
+    @sales_ns.doc(params={ADMIN_KEY_HEADER: {'in': 'header', 'description': 'Admin API key (ADMIN_API_KEY)', 'required': True}})
+    @sales_ns.response(200, 'Sales rollups', sales_rollups_response_model)
+    @sales_ns.response(400, 'Invalid parameters')
+    @sales_ns.response(401, 'Missing or invalid admin key')
+    def get(self):
+        """Pre-aggregated revenue, order count and units sold per day, product or brand (admin only)"""
+        if not is_admin_request():
+            return {"message": f"A valid {ADMIN_KEY_HEADER} header is required"}, 401
+        args = sales_rollups_parser.parse_args()
+
+        query = {'dimension': args.dimension}
+        try:
+            day_range = {}
+            if args.date_from:
+                day_range['$gte'] = parse_day(args.date_from)
+            if args.date_to:
+                day_range['$lte'] = parse_day(args.date_to)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if day_range:
+            query['day'] = day_range
+        if args.key:
+            keys = [key.strip() for key in args.key.split(',') if key.strip()]
+            query['key'] = {'$in': keys}
+
+        limit = max(1, min(MAX_ROLLUP_LIMIT, args.limit or DEFAULT_ROLLUP_LIMIT))
+
+        # Served by the (dimension, day, key) index; one extra document tells whether the result was cut off
+        rollups = list(
+            sales_rollups_collection.find(query, {'_id': 0, 'order_ids': 0})
+            .sort([('day', 1), ('key', 1)])
+            .limit(limit + 1)
+        )
+        truncated = len(rollups) > limit
+        rollups = rollups[:limit]
+
+        return {
+            'rollups': rollups,
+            'count': len(rollups),
+            'truncated': truncated
+        }
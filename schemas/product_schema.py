@@ -23,6 +23,14 @@ def get_product_models(api):
         'ports': fields.List(fields.String, required=True, description='Available ports', example=['USB-C', 'HDMI', '3.5mm Audio'])
     })
     
+    specs_numeric_model = api.model('SpecsNumeric', {
+        'ram_gb': fields.Float(description='RAM in GB, parsed from specs.ram', example=16),
+        'storage_gb': fields.Float(description='Total storage in GB, parsed from specs.storage', example=512),
+        'display_inches': fields.Float(description='Screen size in inches, parsed from specs.display', example=15.6),
+        'battery_wh': fields.Float(description='Battery capacity in Wh, parsed from specs.battery', example=86),
+        'gpu_vram_gb': fields.Float(description='GPU memory in GB, parsed from specs.gpu', example=6)
+    })
+    
     variant_spec_model = api.model('VariantSpec', {
         'name': fields.String(required=True, description='Variant name', example='High Performance'),
         'specs': fields.Nested(specs_model, required=True, description='Variant specifications'),
@@ -52,6 +60,7 @@ def get_product_models(api):
         'discount_percent': fields.Integer(required=True, description='Discount percentage', example=10),
         'discount_price': fields.Integer(description='Price after discount', example=31500000),
         'specs': fields.Nested(specs_model, required=True, description='Product specifications'),
+        'specs_numeric': fields.Nested(specs_numeric_model, description='Numeric attributes derived from specs (read-only)'),
         'variant_specs': fields.List(fields.Nested(variant_spec_model), description='Variant specifications', required=False),
         'colors': fields.List(fields.Nested(color_model), description='Available colors', required=False),
         'stock_quantity': fields.Integer(required=True, description='Available stock', example=50),
@@ -240,7 +249,7 @@ class ProductSchema(Schema):
     variant_specs = ma_fields.List(ma_fields.Nested(VariantSpecSchema), required=False, default=[])
     colors = ma_fields.List(ma_fields.Nested(ColorSchema), required=False, default=[])
     stock_quantity = ma_fields.Integer(required=True, validate=validate.Range(min=0))
-    category_ids = ma_fields.List(ma_fields.String(), required=False, default=[])
+    category_ids = ma_fields.List(ma_fields.String(validate=validate.Regexp(r'^[0-9a-fA-F]{24}$', error='Invalid category ID')), required=False, default=[])
     product_info = ma_fields.List(ma_fields.Nested(ProductInfoSchema), required=False, default=[])
     highlights = ma_fields.List(ma_fields.String(), required=False, default=[])
     short_description = ma_fields.String(required=False)
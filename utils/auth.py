@@ -0,0 +1,16 @@
+from flask import request
+import hmac
+import os
+
+ADMIN_KEY_HEADER = 'X-Admin-Key'
+
+def is_admin_request():
+    """True when the request carries the admin key configured in ADMIN_API_KEY.
+
+    Without ADMIN_API_KEY set, no request is an admin request.
+    """
+    expected = os.getenv('ADMIN_API_KEY')
+    provided = request.headers.get(ADMIN_KEY_HEADER)
+    if not expected or not provided:
+        return False
+    return hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8'))
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+import threading
+import time
+
+class CacheBackend:
+    """Interface for cache backends.
+
+    Subclass this to plug in a shared cache (e.g. Redis) and register the
+    factory with set_cache_factory(). Values stored in a cache are treated as
+    read-only by callers.
+    """
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        """Return a dict of counters describing the cache"""
+        raise NotImplementedError
+
+class TTLCache(CacheBackend):
+    """Thread-safe in-process cache with a size limit (LRU eviction) and per-entry TTL"""
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Factory used to build new caches, and the caches created so far by name
+_cache_factory = TTLCache
+_caches = {}
+_caches_lock = threading.Lock()
+
+def set_cache_factory(factory):
+    """Use a different backend for caches created from now on.
+
+    `factory` is called as factory(maxsize=..., ttl=...) and must return a CacheBackend.
+    """
+    global _cache_factory
+    _cache_factory = factory
+
+def get_cache(name, maxsize=1024, ttl=300):
+    """Get the named cache, creating it on first use"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _cache_factory(maxsize=maxsize, ttl=ttl)
+            _caches[name] = cache
+        return cache
+
+def cache_stats():
+    """Return the stats of every named cache"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,66 @@
+from utils.catalog_version import catalog_version
+import threading
+
+# Events emitted by the catalog write paths:
+#   product_saved(product)        - a product was created or updated (formatted document)
+#   product_deleted(product_id)   - a product was deleted
+#   products_changed(query)       - several products matching a MongoDB query were written
+#   category_changed(category_id) - a category was created, updated or deleted
+#   stock_changed(product_ids)    - orders reserved or released stock of these products
+# Every event except stock_changed also bumps the shared catalog version. Stock
+# moves with every order, so instead of invalidating everything keyed by the
+# version, cached product payloads leave stock out and read it when served.
+_listeners = {
+    'product_saved': [],
+    'product_deleted': [],
+    'products_changed': [],
+    'category_changed': [],
+    'stock_changed': [],
+}
+_lock = threading.Lock()
+
+def subscribe(event, listener):
+    """Register a listener for a catalog event"""
+    if event not in _listeners:
+        raise ValueError(f"Unknown catalog event: {event}")
+    with _lock:
+        _listeners[event].append(listener)
+
+def _emit(event, *args, bump_version=True):
+    """Bump the catalog version and call every listener of an event.
+
+    A failure here never fails the write that triggered the event.
+    """
+    if bump_version:
+        try:
+            catalog_version.bump()
+        except Exception as e:
+            print(f"Error bumping catalog version: {str(e)}")
+    
+    with _lock:
+        listeners = list(_listeners[event])
+    for listener in listeners:
+        try:
+            listener(*args)
+        except Exception as e:
+            print(f"Error in {event} listener {getattr(listener, '__name__', listener)}: {str(e)}")
+
+def product_saved(product):
+    """Notify listeners that a product was created or updated"""
+    _emit('product_saved', product)
+
+def product_deleted(product_id):
+    """Notify listeners that a product was deleted"""
+    _emit('product_deleted', str(product_id))
+
+def products_changed(query):
+    """Notify listeners that the products matching `query` were written in bulk"""
+    _emit('products_changed', query)
+
+def category_changed(category_id):
+    """Notify listeners that a category was created, updated or deleted"""
+    _emit('category_changed', str(category_id))
+
+def stock_changed(product_ids):
+    """Notify listeners that the stock of some products changed"""
+    _emit('stock_changed', [str(product_id) for product_id in product_ids], bump_version=False)
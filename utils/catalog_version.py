@@ -0,0 +1,217 @@
+from bson import ObjectId
+from pymongo import ReturnDocument
+from database import catalog_meta_collection
+import os
+import threading
+import time
+
+class CatalogVersion:
+    """Catalog version number shared by every worker through a counter document.
+
+    Every product or category write bumps the counter. Readers use a locally
+    cached copy that is re-read from MongoDB at most once per `check_seconds`,
+    so checking the version is normally free and writes made by other workers
+    are seen within that interval.
+    """
+    def __init__(self, collection, key='catalog', check_seconds=1.0):
+        self.collection = collection
+        self.key = key
+        self.check_seconds = check_seconds
+        self._version = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return the current catalog version"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return self._version
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_seconds:
+                document = self.collection.find_one({'_id': self.key}, {'version': 1})
+                self._version = document.get('version', 0) if document else 0
+                self._checked_at = time.monotonic()
+            return self._version
+
+    def bump(self, *args):
+        """Increment the version. Accepts and ignores event arguments so it can be used as a listener."""
+        document = self.collection.find_one_and_update(
+            {'_id': self.key},
+            {'$inc': {'version': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        with self._lock:
+            self._version = document['version']
+            self._checked_at = time.monotonic()
+        return self._version
+
+class VersionedSnapshot:
+    """Value computed by `compute` and kept until the catalog version changes"""
+    def __init__(self, compute, version):
+        self.compute = compute
+        self.version = version
+        self._value = None
+        self._value_version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return a (value, version) tuple, recomputing the value if the catalog changed"""
+        version = self.version.current()
+        if self._value_version == version:
+            return self._value, version
+        with self._lock:
+            if self._value_version != version:
+                self._value = self.compute()
+                self._value_version = version
+            return self._value, version
+
+class VersionedLoader:
+    """In-memory structure built from a collection and kept in step with the catalog version.
+
+    Subclasses provide build(documents), returning a fresh snapshot object
+    with add(document) and remove(doc_id), and the projection (and optional
+    sort) used to read the documents. Writes made by this process arrive
+    through the catalog events and are applied to the snapshot in place.
+
+    The first load runs in the calling request. Afterwards, when the catalog
+    version moves without a local write (another process wrote), or after
+    refresh_seconds, a fresh snapshot is built in a background thread while
+    requests keep using the previous one; local writes made during the build
+    are replayed onto the fresh snapshot, which is then swapped in as one
+    object.
+    """
+    projection = None
+    sort = None
+    # Re-read saved products from MongoDB instead of using the formatted event document
+    reread_saved = False
+    # Seconds to wait before retrying a failed background rebuild
+    retry_seconds = 10
+
+    def __init__(self, collection, version, refresh_seconds=300):
+        self.collection = collection
+        self.version = version
+        self.refresh_seconds = refresh_seconds
+        self._loaded = (None, None, None)  # (snapshot, catalog version, monotonic load time)
+        self._pending = None  # Local writes made while a snapshot is being built
+        self._rebuilding = False
+        self._retry_at = 0
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.RLock()
+
+    def build(self, documents):
+        """Return a new snapshot holding the given documents"""
+        raise NotImplementedError
+
+    @property
+    def loaded_version(self):
+        """Catalog version of the loaded snapshot (None before the first load)"""
+        return self._loaded[1]
+
+    def _is_fresh(self, loaded):
+        snapshot, version, loaded_at = loaded
+        return (snapshot is not None
+                and time.monotonic() - loaded_at < self.refresh_seconds
+                and version == self.version.current())
+
+    def get(self):
+        """Return (snapshot, version) of the snapshot to serve.
+
+        Loads the snapshot on first use; when it fell behind the catalog, a
+        rebuild is started in the background and the current one is returned.
+        """
+        loaded = self._loaded
+        if loaded[0] is None:
+            with self._load_lock:
+                if self._loaded[0] is None:
+                    self.reload()
+                loaded = self._loaded
+        elif not self._is_fresh(loaded):
+            self._start_rebuild()
+        return loaded[0], loaded[1]
+
+    def _start_rebuild(self):
+        with self._state_lock:
+            if self._rebuilding or time.monotonic() < self._retry_at:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name=f'{type(self).__name__}-rebuild', daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            with self._load_lock:
+                self.reload()
+        except Exception as e:
+            print(f"Error rebuilding {type(self).__name__}: {str(e)}")
+            self._retry_at = time.monotonic() + self.retry_seconds
+        finally:
+            self._rebuilding = False
+
+    def reload(self):
+        """Build a fresh snapshot from MongoDB and swap it in"""
+        with self._state_lock:
+            self._pending = []
+        try:
+            version = self.version.current()
+            cursor = self.collection.find({}, self.projection)
+            if self.sort:
+                cursor = cursor.sort(self.sort)
+            snapshot = self.build(cursor)
+        except Exception:
+            with self._state_lock:
+                self._pending = None
+            raise
+
+        with self._state_lock:
+            pending, self._pending = self._pending, None
+            for change in pending:
+                change(snapshot)
+            # Every replayed write bumped the version once; if nothing else moved
+            # it, the fresh snapshot is current
+            if pending and version + len(pending) == self.version.current():
+                version += len(pending)
+            self._loaded = (snapshot, version, time.monotonic())
+
+    def _apply(self, change):
+        """Apply a local write to the loaded snapshot and advance it to the version the write brought"""
+        with self._state_lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            snapshot, loaded_version, loaded_at = self._loaded
+            if snapshot is None:
+                return
+            change(snapshot)
+            # The event being handled has just bumped the version by one. If it moved
+            # further, another process wrote too and the snapshot is rebuilt.
+            version = self.version.current()
+            if loaded_version == version - 1:
+                self._loaded = (snapshot, version, loaded_at)
+
+    def add_matching(self, query):
+        """Re-read the documents matching a MongoDB query into the snapshot"""
+        if self._loaded[0] is None and self._pending is None:
+            return
+        documents = list(self.collection.find(query, self.projection))
+
+        def add_documents(snapshot):
+            for document in documents:
+                snapshot.add(document)
+        self._apply(add_documents)
+
+    def on_product_saved(self, product):
+        if self.reread_saved:
+            self.add_matching({'_id': ObjectId(product['_id'])})
+        else:
+            self._apply(lambda snapshot: snapshot.add(product))
+
+    def on_product_deleted(self, product_id):
+        self._apply(lambda snapshot: snapshot.remove(product_id))
+
+    def on_category_changed(self, category_id):
+        self._apply(lambda snapshot: None)
+
+# Version of the whole catalog (products and categories), bumped by utils.catalog_events
+catalog_version = CatalogVersion(
+    catalog_meta_collection,
+    check_seconds=float(os.getenv('CATALOG_VERSION_CHECK_SECONDS', '1'))
+)
@@ -0,0 +1,242 @@
+from bson import ObjectId
+from datetime import datetime
+from utils.catalog_version import VersionedLoader
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it the engine is unavailable
+    np = None
+
+COLUMNAR_AVAILABLE = np is not None
+
+# Numeric columns kept by the engine, and the fields they can be sorted by
+NUMERIC_FIELDS = ('price', 'discount_percent', 'discount_price', 'created_at')
+CODED_FIELDS = ('brand', 'status')
+SORTABLE_FIELDS = ('price', 'discount_price', 'discount_percent', 'created_at')
+INITIAL_CAPACITY = 1024
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _to_number(field, value):
+    """Column value of a field: a float (a datetime as epoch seconds for created_at), NaN when
+    missing, or None when the value has another type (e.g. a price stored as a string)"""
+    if value is None:
+        return float('nan')
+    if field == 'created_at':
+        if isinstance(value, datetime):
+            return (value.replace(tzinfo=None) - _EPOCH).total_seconds()
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+class ColumnarCatalog:
+    """In-memory columnar copy of the fields used by structured search.
+
+    Prices, discounts and timestamps are float64 columns; brand and status are
+    dictionary-encoded int32 columns; category membership is a bitset per
+    product (one uint64 word per 64 categories). A search turns the filters
+    into boolean masks and selects the requested page with argpartition, so
+    only the page's documents have to be read from MongoDB.
+
+    Values of another type than the column's (e.g. prices stored as strings)
+    are flagged: MongoDB orders them by BSON type, after every number, so a
+    search sorting on a column where a matched row is flagged falls back to
+    MongoDB.
+
+    Rows are kept in _id order (new products get larger ObjectIds and are
+    appended) and updated in place on writes; deleted products are marked
+    dead and dropped on the next rebuild.
+    """
+    def __init__(self):
+        if not COLUMNAR_AVAILABLE:
+            raise RuntimeError('numpy is required for the columnar search engine')
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self, capacity=INITIAL_CAPACITY):
+        self._ids = []
+        self._rows = {}
+        self._count = 0
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._numeric = {field: np.full(capacity, np.nan) for field in NUMERIC_FIELDS}
+        self._foreign = {field: np.zeros(capacity, dtype=bool) for field in NUMERIC_FIELDS}
+        self._codes = {field: np.full(capacity, -1, dtype=np.int32) for field in CODED_FIELDS}
+        self._dictionaries = {field: {} for field in CODED_FIELDS}
+        self._category_bits = {}
+        self._categories = np.zeros((capacity, 1), dtype=np.uint64)
+
+    @property
+    def size(self):
+        """Number of products in the snapshot"""
+        return len(self._rows)
+
+    def _grow(self, capacity):
+        def resized(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self._alive = resized(self._alive, False)
+        self._numeric = {field: resized(column, np.nan) for field, column in self._numeric.items()}
+        self._foreign = {field: resized(column, False) for field, column in self._foreign.items()}
+        self._codes = {field: resized(column, -1) for field, column in self._codes.items()}
+        self._categories = resized(self._categories, 0)
+
+    def _code(self, field, value):
+        if not isinstance(value, str):
+            return -1
+        dictionary = self._dictionaries[field]
+        if value not in dictionary:
+            dictionary[value] = len(dictionary)
+        return dictionary[value]
+
+    def _category_bit(self, category_id):
+        category_id = str(category_id)
+        bit = self._category_bits.get(category_id)
+        if bit is None:
+            bit = len(self._category_bits)
+            self._category_bits[category_id] = bit
+            words = bit // 64 + 1
+            if words > self._categories.shape[1]:
+                widened = np.zeros((len(self._categories), words), dtype=np.uint64)
+                widened[:, :self._categories.shape[1]] = self._categories
+                self._categories = widened
+        return bit
+
+    def add(self, document):
+        """Add (or update) a product document"""
+        doc_id = str(document['_id'])
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                row = self._count
+                if row == len(self._alive):
+                    self._grow(len(self._alive) * 2)
+                self._count += 1
+                self._ids.append(ObjectId(doc_id))
+                self._rows[doc_id] = row
+
+            self._alive[row] = True
+            for field in NUMERIC_FIELDS:
+                value = _to_number(field, document.get(field))
+                self._foreign[field][row] = value is None
+                self._numeric[field][row] = np.nan if value is None else value
+            for field in CODED_FIELDS:
+                self._codes[field][row] = self._code(field, document.get(field))
+
+            bits = [self._category_bit(category_id) for category_id in document.get('category_ids') or []]
+            self._categories[row] = 0
+            for bit in bits:
+                self._categories[row, bit // 64] |= np.uint64(1 << (bit % 64))
+
+    def remove(self, doc_id):
+        """Remove a product from the snapshot"""
+        with self._lock:
+            row = self._rows.pop(str(doc_id), None)
+            if row is not None:
+                self._alive[row] = False
+
+    def rebuild(self, documents):
+        """Replace the whole snapshot with the given documents"""
+        with self._lock:
+            self._reset()
+            for document in documents:
+                self.add(document)
+
+    def _coded_mask(self, field, values, count):
+        dictionary = self._dictionaries[field]
+        codes = [dictionary[value] for value in values if value in dictionary]
+        return np.isin(self._codes[field][:count], codes)
+
+    def _filter_mask(self, query, count):
+        """Boolean mask of the rows matching a search query, or None if the query is not supported"""
+        mask = self._alive[:count].copy()
+        for field, condition in query.items():
+            if field == '_id' and isinstance(condition, dict) and set(condition) == {'$in'}:
+                rows = [self._rows.get(str(product_id)) for product_id in condition['$in']]
+                id_mask = np.zeros(count, dtype=bool)
+                id_mask[[row for row in rows if row is not None and row < count]] = True
+                mask &= id_mask
+            elif field in NUMERIC_FIELDS and isinstance(condition, dict) and set(condition) <= {'$gte', '$lte'}:
+                # NaN never satisfies a comparison, like a missing field or a value of
+                # another type in MongoDB (comparisons only match values of the same type)
+                column = self._numeric[field][:count]
+                with np.errstate(invalid='ignore'):
+                    if '$gte' in condition:
+                        mask &= column >= condition['$gte']
+                    if '$lte' in condition:
+                        mask &= column <= condition['$lte']
+            elif field in CODED_FIELDS and isinstance(condition, dict) and set(condition) == {'$in'}:
+                mask &= self._coded_mask(field, condition['$in'], count)
+            elif field == 'category_ids' and isinstance(condition, dict) and set(condition) == {'$in'}:
+                wanted = np.zeros(self._categories.shape[1], dtype=np.uint64)
+                for category_id in condition['$in']:
+                    bit = self._category_bits.get(str(category_id))
+                    if bit is not None:
+                        wanted[bit // 64] |= np.uint64(1 << (bit % 64))
+                mask &= (self._categories[:count] & wanted).any(axis=1)
+            else:
+                return None
+        return mask
+
+    def search(self, query, sort_field, sort_order, skip, limit):
+        """Run a structured search against the snapshot.
+
+        `query` is a filter built by build_search_query. Returns (page_ids, total)
+        where page_ids are the ObjectIds of the requested page in sort order, or
+        None when the query or sort cannot be served from the snapshot, including
+        when a matched row holds a value of another type in the sort column.
+        Missing values sort first in ascending order and last in descending
+        order; ties are broken by _id in the sort direction, like the
+        (sort_field, _id) sort used by MongoDB searches.
+        """
+        if sort_field not in SORTABLE_FIELDS:
+            return None
+        with self._lock:
+            count = self._count
+            mask = self._filter_mask(query, count)
+            if mask is None:
+                return None
+
+            # Rows are in _id order, so stable sorting breaks ties by _id in the sort direction
+            matched = np.flatnonzero(mask)
+            if self._foreign[sort_field][matched].any():
+                return None
+            if sort_order < 0:
+                matched = matched[::-1]
+            total = len(matched)
+            keys = np.nan_to_num(self._numeric[sort_field][matched], nan=-np.inf)
+            if sort_order < 0:
+                keys = -keys
+
+            # Only the first skip + limit positions need ordering
+            k = min(skip + limit, total)
+            if k == 0:
+                order = np.empty(0, dtype=np.intp)
+            elif k < total:
+                kth = np.partition(keys, k - 1)[k - 1]
+                candidates = np.flatnonzero(keys <= kth)
+                order = candidates[np.argsort(keys[candidates], kind='stable')][:k]
+            else:
+                order = np.argsort(keys, kind='stable')
+
+            page_rows = matched[order[skip:skip + limit]]
+            return [self._ids[row] for row in page_rows], total
+
+# Fields read from MongoDB to build the snapshot
+SNAPSHOT_PROJECTION = {field: 1 for field in NUMERIC_FIELDS + CODED_FIELDS + ('category_ids',)}
+
+class ProductColumnarCatalog(VersionedLoader):
+    """ColumnarCatalog snapshot of the products collection, kept in step with the catalog version"""
+    projection = SNAPSHOT_PROJECTION
+    # Rows are kept in _id order
+    sort = [('_id', 1)]
+    # Events carry the formatted document, so saved products are re-read for their stored values
+    reread_saved = True
+
+    def build(self, documents):
+        snapshot = ColumnarCatalog()
+        snapshot.rebuild(documents)
+        return snapshot
@@ -0,0 +1,147 @@
+from flask import request
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+from functools import wraps
+import hashlib
+import json
+import time
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+class IdempotencyStore:
+    """Responses of requests made with an Idempotency-Key, one document per key.
+
+    The first request with a key inserts an in-progress document (the unique
+    _id makes this the lock) and runs; its successful response is stored on
+    the document. Requests repeating the key get the stored response, and
+    while the first one is still running they poll for it instead of running
+    again. A request holding a key for longer than `lock_seconds` is
+    considered dead and the key is taken over. Documents are removed by a TTL
+    index on created_at.
+    """
+    def __init__(self, collection, lock_seconds=30, wait_seconds=10, poll_interval=0.1):
+        self.collection = collection
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_interval = poll_interval
+
+    def begin(self, key, fingerprint):
+        """Claim a key. Returns (state, document) where state is one of:
+
+        'acquired'    - the caller runs the request and then calls complete() or release()
+        'completed'   - document['response'] holds the stored response
+        'mismatch'    - the key was used for a different request
+        'in_progress' - another request still holds the key after waiting
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            now = datetime.utcnow()
+            try:
+                self.collection.insert_one({
+                    '_id': key,
+                    'fingerprint': fingerprint,
+                    'status': 'in_progress',
+                    'locked_until': now + timedelta(seconds=self.lock_seconds),
+                    'created_at': now
+                })
+                return 'acquired', None
+            except DuplicateKeyError:
+                pass
+
+            document = self.collection.find_one({'_id': key})
+            if document is None:
+                # Released or expired in between, so try to claim it again
+                continue
+            if document.get('fingerprint') != fingerprint:
+                return 'mismatch', document
+            if document.get('status') == 'completed':
+                return 'completed', document
+
+            # Take over a key whose request died without completing it
+            if document['locked_until'] <= now:
+                taken = self.collection.find_one_and_update(
+                    {'_id': key, 'status': 'in_progress', 'locked_until': document['locked_until']},
+                    {'$set': {'locked_until': now + timedelta(seconds=self.lock_seconds)}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if taken:
+                    return 'acquired', None
+                continue
+
+            if time.monotonic() >= deadline:
+                return 'in_progress', document
+            time.sleep(self.poll_interval)
+
+    def complete(self, key, body, status_code):
+        """Store the response of a key's request"""
+        self.collection.update_one(
+            {'_id': key},
+            {'$set': {
+                'status': 'completed',
+                'response': {'body': body, 'status_code': status_code},
+                'completed_at': datetime.utcnow()
+            }, '$unset': {'locked_until': ''}}
+        )
+
+    def release(self, key):
+        """Give up a key without storing a response, so the request can be retried"""
+        self.collection.delete_one({'_id': key, 'status': 'in_progress'})
+
+def request_fingerprint():
+    """Hash of the request method, path and body (JSON bodies are compared by content)"""
+    body = request.get_json(silent=True)
+    if body is not None:
+        payload = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    else:
+        payload = request.get_data()
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}\n".encode('utf-8'))
+    digest.update(payload)
+    return digest.hexdigest()
+
+def idempotent(store, stored_status_codes=(201,)):
+    """Decorator for a Resource method honouring the Idempotency-Key header.
+
+    Only responses with a status in `stored_status_codes` are stored; after
+    any other response the key is released so the client can retry. Requests
+    without the header run as usual.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return method(*args, **kwargs)
+            key = key.strip()
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return {"message": f"{IDEMPOTENCY_HEADER} must be between 1 and {MAX_KEY_LENGTH} characters"}, 400
+
+            state, document = store.begin(key, request_fingerprint())
+            if state == 'completed':
+                response = document['response']
+                return response['body'], response['status_code'], {REPLAYED_HEADER: 'true'}
+            if state == 'mismatch':
+                return {"message": f"{IDEMPOTENCY_HEADER} was already used for a different request"}, 422
+            if state == 'in_progress':
+                return {"message": f"A request with this {IDEMPOTENCY_HEADER} is still being processed"}, 409
+
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                store.release(key)
+                raise
+
+            body, status_code = (result[0], result[1]) if isinstance(result, tuple) else (result, 200)
+            if status_code in stored_status_codes:
+                try:
+                    store.complete(key, body, status_code)
+                except Exception as e:
+                    print(f"Error storing idempotent response: {str(e)}")
+            else:
+                store.release(key)
+            return result
+        return wrapper
+    return decorator
@@ -31,6 +31,24 @@ def str_to_object_id(id_str):
     except:
         return id_str
 
+def to_category_object_ids(category_ids):
+    """Convert category IDs to the canonical stored type (ObjectId).
+
+    Empty values are dropped. Raises ValueError for IDs that are not valid ObjectIds.
+    """
+    result = []
+    for category_id in category_ids or []:
+        if isinstance(category_id, ObjectId):
+            result.append(category_id)
+            continue
+        category_id = str(category_id).strip()
+        if not category_id:
+            continue
+        if not ObjectId.is_valid(category_id):
+            raise ValueError(f"Invalid category ID: {category_id}")
+        result.append(ObjectId(category_id))
+    return result
+
 def parse_json(data):
     """Convert MongoDB data types to JSON-serializable types."""
     for key, value in data.items():
@@ -55,6 +73,9 @@ def format_product(product):
     if '_id' in product:
         product['_id'] = str(product['_id'])
     
+    # Tokens of stock reservations in flight are internal
+    product.pop('stock_reservations', None)
+    
     if 'category_id' in product and product['category_id']:
         product['category_id'] = str(product['category_id'])
     
@@ -0,0 +1,44 @@
+from pymongo import ReturnDocument
+from datetime import datetime
+import threading
+
+class OrderNumberAllocator:
+    """Issues order numbers TS-YYYYMMDD-NNN from a per-day counter document.
+
+    Each worker reserves a block of `block_size` sequence numbers with one
+    atomic $inc and hands them out from memory, so most orders cost no round
+    trip. Numbers never repeat; a block left unused when a worker stops or
+    the day changes leaves a gap in the sequence.
+    """
+    def __init__(self, collection, block_size=20):
+        self.collection = collection
+        self.block_size = block_size
+        self._day = None
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve_block(self, day):
+        counter = self.collection.find_one_and_update(
+            {'_id': day},
+            {'$inc': {'seq': self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._day = day
+        self._next = counter['seq'] - self.block_size + 1
+        self._end = counter['seq']
+
+    def next_sequence(self, day):
+        """Next sequence number of `day` (YYYYMMDD)"""
+        with self._lock:
+            if day != self._day or self._next > self._end:
+                self._reserve_block(day)
+            sequence = self._next
+            self._next += 1
+            return sequence
+
+    def next_order_number(self, now=None):
+        """Next order number for the current day"""
+        day = (now or datetime.now()).strftime('%Y%m%d')
+        return f"TS-{day}-{self.next_sequence(day):03d}"
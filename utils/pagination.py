@@ -0,0 +1,93 @@
+from bson import ObjectId
+from datetime import datetime
+import base64
+import json
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor is malformed or does not match the requested sort"""
+    pass
+
+def _encode_value(value):
+    """Convert a sort key value into a JSON-safe representation."""
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    return value
+
+def _decode_value(value):
+    """Inverse of _encode_value."""
+    if isinstance(value, dict):
+        if '$date' in value:
+            return datetime.fromisoformat(value['$date'])
+        if '$oid' in value:
+            return ObjectId(value['$oid'])
+    return value
+
+def encode_cursor(sort_field, sort_value, last_id):
+    """Build an opaque cursor from the sort key of the last document of a page"""
+    payload = {'f': sort_field, 'id': str(last_id)}
+    if sort_field != '_id':
+        payload['v'] = _encode_value(sort_value)
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_field):
+    """Decode a cursor produced by encode_cursor.
+
+    Returns a (sort_value, last_id) tuple. Raises InvalidCursor if the cursor
+    cannot be decoded or was issued for a different sort field.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        last_id = ObjectId(payload['id'])
+        sort_value = _decode_value(payload.get('v'))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+    if payload.get('f') != sort_field:
+        raise InvalidCursor("Cursor does not match the requested sort order")
+
+    return sort_value, last_id
+
+def keyset_filter(sort_field, sort_value, last_id, direction):
+    """Build the query that selects documents strictly after (sort_value, last_id).
+
+    The matching sort is [(sort_field, direction), ('_id', direction)].
+    Documents with a missing/null sort key sort before every other value in
+    MongoDB, so they are handled explicitly to keep pages contiguous.
+    """
+    op = '$gt' if direction == 1 else '$lt'
+
+    if sort_field == '_id':
+        return {'_id': {op: last_id}}
+
+    if sort_value is None:
+        same_key = {sort_field: None, '_id': {op: last_id}}
+        if direction == 1:
+            return {'$or': [same_key, {sort_field: {'$ne': None}}]}
+        return same_key
+
+    conditions = [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, '_id': {op: last_id}}
+    ]
+    if direction == -1:
+        conditions.append({sort_field: None})
+    return {'$or': conditions}
+
+def keyset_sort(sort_field, direction):
+    """Sort specification that matches keyset_filter"""
+    if sort_field == '_id':
+        return [('_id', direction)]
+    return [(sort_field, direction), ('_id', direction)]
+
+def get_sort_value(document, sort_field):
+    """Read a (possibly dotted) sort key from a raw MongoDB document"""
+    value = document
+    for part in sort_field.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
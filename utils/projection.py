@@ -0,0 +1,52 @@
+from flask_restx import fields
+
+class InvalidFields(ValueError):
+    """Raised when a fields= parameter references fields that are not in the model"""
+    pass
+
+def _nested_model(field):
+    """Return the model wrapped by a Nested field (or a List of Nested), if any."""
+    if isinstance(field, fields.List):
+        field = field.container
+    if isinstance(field, fields.Nested):
+        return field.model
+    return None
+
+def model_field_paths(model):
+    """Collect every field path (dotted for nested models) declared by a Flask-RESTx model"""
+    paths = set()
+    for name, field in model.items():
+        paths.add(name)
+        nested = _nested_model(field)
+        if nested is not None:
+            for sub_path in model_field_paths(nested):
+                paths.add(f'{name}.{sub_path}')
+    return paths
+
+def build_projection(fields_param, allowed_paths):
+    """Turn a comma-separated fields= value into a MongoDB inclusion projection.
+
+    Returns None when no fields were requested. `_id` is always included.
+    Raises InvalidFields if any requested field is not in `allowed_paths`.
+    """
+    if not fields_param:
+        return None
+
+    requested = [field.strip() for field in fields_param.split(',') if field.strip()]
+    if not requested:
+        return None
+
+    unknown = [field for field in requested if field not in allowed_paths]
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+
+    # MongoDB rejects projections containing both a path and one of its parents
+    selected = set(requested)
+    paths = [
+        field for field in selected
+        if not any(field.startswith(parent + '.') for parent in selected if parent != field)
+    ]
+
+    projection = {path: 1 for path in sorted(paths)}
+    projection['_id'] = 1
+    return projection
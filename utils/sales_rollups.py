@@ -0,0 +1,182 @@
+from bson import ObjectId
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta
+
+# Rollup dimensions: one document per day, per day and product, and per day and brand
+DIMENSIONS = ('day', 'product', 'brand')
+
+# Orders in these statuses are left out of rebuilt rollups
+EXCLUDED_STATUSES = ['cancelled']
+
+# Orders created within this margin before a rebuild started are replayed after
+# the swap, so orders recorded into the replaced collection are not lost. The
+# margin also covers clients whose clocks (and so ObjectIds) run behind.
+REBUILD_REPLAY_MARGIN = timedelta(minutes=10)
+
+# Duplicate key error: an upsert found the rollup document already holding the order
+DUPLICATE_KEY_ERROR = 11000
+
+def rollup_id(day, dimension, key):
+    return f"{day}:{dimension}:{key}"
+
+def order_rollup_updates(order):
+    """Increments of every rollup document an order contributes to.
+
+    Returns {rollup _id: {'day', 'dimension', 'key', 'name', 'revenue', 'orders', 'units'}}.
+    Revenue is the order total for the day and the item subtotals for products
+    and brands; orders counts each order once per product or brand it contains.
+    Items without a brand are not counted in the brand rollups.
+    """
+    order_date = order.get('orderDate')
+    if not isinstance(order_date, datetime):
+        return {}
+    day = order_date.strftime('%Y-%m-%d')
+
+    items = order.get('items') or []
+    updates = {
+        rollup_id(day, 'day', 'all'): {
+            'day': day, 'dimension': 'day', 'key': 'all', 'name': None,
+            'revenue': order.get('total', 0) or 0, 'orders': 1,
+            'units': sum(item.get('quantity', 0) or 0 for item in items)
+        }
+    }
+    for item in items:
+        entries = []
+        if item.get('productId') is not None:
+            entries.append(('product', str(item['productId']), item.get('productName')))
+        if item.get('brand'):
+            entries.append(('brand', item['brand'], item['brand']))
+        for dimension, key, name in entries:
+            update = updates.setdefault(rollup_id(day, dimension, key), {
+                'day': day, 'dimension': dimension, 'key': key, 'name': name,
+                'revenue': 0, 'orders': 1, 'units': 0
+            })
+            update['revenue'] += item.get('subtotal', 0) or 0
+            update['units'] += item.get('quantity', 0) or 0
+    return updates
+
+def rollup_operations(updates, order_id=None):
+    """$inc upserts applying rollup increments.
+
+    With an order_id, every update also pushes the order onto the document's
+    order_ids and only matches documents not holding it yet, so applying an
+    order twice counts it once (the upsert then fails with a duplicate key).
+    """
+    operations = []
+    for _id, update in updates.items():
+        query = {'_id': _id}
+        change = {
+            '$inc': {'revenue': update['revenue'], 'orders': update['orders'], 'units': update['units']},
+            '$set': {'day': update['day'], 'dimension': update['dimension'], 'key': update['key'], 'name': update['name']}
+        }
+        if order_id is not None:
+            query['order_ids'] = {'$ne': order_id}
+            change['$push'] = {'order_ids': order_id}
+        operations.append(UpdateOne(query, change, upsert=True))
+    return operations
+
+def record_order(collection, order):
+    """Add an order to the rollups, once. A failure is logged and never fails the order."""
+    operations = rollup_operations(order_rollup_updates(order), order.get('_id'))
+    if not operations:
+        return
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY_ERROR]
+        if errors:
+            print(f"Error updating sales rollups for order {order.get('orderNumber')}: {errors}")
+    except Exception as e:
+        print(f"Error updating sales rollups for order {order.get('orderNumber')}: {str(e)}")
+
+# Fields of an order read by the rollups
+ORDER_ROLLUP_PROJECTION = {
+    'orderNumber': 1, 'orderDate': 1, 'total': 1, 'status': 1,
+    'items.productId': 1, 'items.productName': 1, 'items.brand': 1,
+    'items.quantity': 1, 'items.subtotal': 1
+}
+
+def _fill_brands(orders, products_collection):
+    """Look up the brand of items stored before orders recorded it, one query per batch"""
+    missing = {item['productId'] for order in orders for item in order.get('items') or []
+               if not item.get('brand') and isinstance(item.get('productId'), ObjectId)}
+    if not missing:
+        return
+    brands = {product['_id']: product.get('brand')
+              for product in products_collection.find({'_id': {'$in': list(missing)}}, {'brand': 1})}
+    for order in orders:
+        for item in order.get('items') or []:
+            if not item.get('brand'):
+                item['brand'] = brands.get(item.get('productId'))
+
+def rebuild_sales_rollups(database, batch_size=1000):
+    """Recompute the sales_rollups collection from every order.
+
+    Orders are read in _id batches and the rollups are accumulated in memory
+    (one entry per day and product or brand), written to a temporary
+    collection and swapped in with a rename, so readers never see a partial
+    rebuild.
+
+    Orders recorded while the rebuild ran may have gone to the replaced
+    collection, so after the swap every order created since the rebuild
+    started (less REBUILD_REPLAY_MARGIN) is recorded again. Rollup documents
+    list the recent orders they hold in order_ids, so replaying an order that
+    is already counted changes nothing.
+
+    Returns a summary with the number of orders, rollup documents and
+    replayed orders.
+    """
+    orders_collection = database.orders
+    temp_name = 'sales_rollups_rebuild'
+    database.drop_collection(temp_name)
+    replay_from = ObjectId.from_datetime(datetime.utcnow() - REBUILD_REPLAY_MARGIN)
+
+    rollups = {}
+    processed = 0
+    last_id = None
+    query = {'status': {'$nin': EXCLUDED_STATUSES}}
+    while True:
+        batch_query = dict(query, _id={'$gt': last_id}) if last_id else query
+        orders = list(orders_collection.find(batch_query, ORDER_ROLLUP_PROJECTION).sort('_id', ASCENDING).limit(batch_size))
+        if not orders:
+            break
+        _fill_brands(orders, database.products)
+        for order in orders:
+            for _id, update in order_rollup_updates(order).items():
+                rollup = rollups.setdefault(_id, dict(update, revenue=0, orders=0, units=0))
+                rollup['revenue'] += update['revenue']
+                rollup['orders'] += update['orders']
+                rollup['units'] += update['units']
+                if update['name']:
+                    rollup['name'] = update['name']
+                # Orders that will be replayed must be recognisable as counted
+                if order['_id'] >= replay_from:
+                    rollup.setdefault('order_ids', []).append(order['_id'])
+        processed += len(orders)
+        last_id = orders[-1]['_id']
+        print(f"sales_rollups: processed {processed} orders")
+
+    temp = database[temp_name]
+    documents = [dict(rollup, _id=_id) for _id, rollup in rollups.items()]
+    for start in range(0, len(documents), batch_size):
+        temp.insert_many(documents[start:start + batch_size], ordered=False)
+    temp.create_index([('dimension', ASCENDING), ('day', ASCENDING), ('key', ASCENDING)], name='dimension_day_key')
+
+    if documents:
+        temp.rename('sales_rollups', dropTarget=True)
+    else:
+        database.drop_collection('sales_rollups')
+        database.drop_collection(temp_name)
+
+    # Every order recorded from now on goes to the new collection. Replay the
+    # recent ones, which may have been recorded into the replaced collection
+    # or missed by the scan.
+    replayed = 0
+    replay = dict(query, _id={'$gte': replay_from})
+    for order in orders_collection.find(replay, ORDER_ROLLUP_PROJECTION).sort('_id', ASCENDING):
+        _fill_brands([order], database.products)
+        record_order(database.sales_rollups, order)
+        replayed += 1
+
+    return {'orders': processed, 'rollups': len(documents), 'replayed': replayed}
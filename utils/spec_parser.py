@@ -0,0 +1,78 @@
+import re
+
+# Numeric attributes derived from the free-text specs, stored under `specs_numeric`
+SPEC_NUMERIC_FIELDS = ('ram_gb', 'storage_gb', 'display_inches', 'battery_wh', 'gpu_vram_gb')
+
+_CAPACITY_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*(tb|gb|mb)(?![a-z])', re.IGNORECASE)
+_INCHES_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*(?:-\s*)?(?:inch(?:es)?|in(?![a-z])|"|”|\'\')', re.IGNORECASE)
+_DECIMAL_PATTERN = re.compile(r'(?<![\d.,])(\d{1,2}[.,]\d)(?![\d.,])')
+_WATT_HOURS_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*w\s*h', re.IGNORECASE)
+
+_UNIT_GB = {'tb': 1024, 'gb': 1, 'mb': 1 / 1024}
+
+def _number(text):
+    return float(text.replace(',', '.'))
+
+def _clean(value):
+    """Store whole numbers as ints"""
+    value = round(value, 2)
+    return int(value) if value == int(value) else value
+
+def parse_capacity_gb(text):
+    """First memory/storage capacity in `text`, in GB ("16GB DDR5" -> 16, "1TB SSD" -> 1024)"""
+    if not isinstance(text, str):
+        return None
+    match = _CAPACITY_PATTERN.search(text)
+    if not match:
+        return None
+    return _clean(_number(match.group(1)) * _UNIT_GB[match.group(2).lower()])
+
+def parse_storage_gb(text):
+    """Total storage in GB, adding drives listed with "+" ("512GB SSD + 1TB HDD" -> 1536)"""
+    if not isinstance(text, str):
+        return None
+    capacities = [parse_capacity_gb(part) for part in text.split('+')]
+    capacities = [capacity for capacity in capacities if capacity is not None]
+    return _clean(sum(capacities)) if capacities else None
+
+def parse_display_inches(text):
+    """Screen diagonal in inches ("15.6 inch 4K OLED", '14" FHD', "13.3-inch" -> 15.6, 14, 13.3).
+
+    Without a unit, a lone decimal number in laptop screen range is used ("15.6 FHD").
+    """
+    if not isinstance(text, str):
+        return None
+    match = _INCHES_PATTERN.search(text)
+    if match:
+        return _clean(_number(match.group(1)))
+    match = _DECIMAL_PATTERN.search(text)
+    if match and 7 <= _number(match.group(1)) <= 21:
+        return _clean(_number(match.group(1)))
+    return None
+
+def parse_battery_wh(text):
+    """Battery capacity in watt-hours ("4-cell 54Wh", "86 WHr" -> 54, 86)"""
+    if not isinstance(text, str):
+        return None
+    match = _WATT_HOURS_PATTERN.search(text)
+    return _clean(_number(match.group(1))) if match else None
+
+# Derived field -> (specs field, parser)
+_PARSERS = {
+    'ram_gb': ('ram', parse_capacity_gb),
+    'storage_gb': ('storage', parse_storage_gb),
+    'display_inches': ('display', parse_display_inches),
+    'battery_wh': ('battery', parse_battery_wh),
+    'gpu_vram_gb': ('gpu', parse_capacity_gb),
+}
+
+def derive_specs_numeric(specs):
+    """Numeric attributes parsed from a specs dict. Attributes that cannot be parsed are left out."""
+    if not isinstance(specs, dict):
+        return {}
+    derived = {}
+    for field, (spec_field, parser) in _PARSERS.items():
+        value = parser(specs.get(spec_field))
+        if value is not None:
+            derived[field] = value
+    return derived
@@ -0,0 +1,85 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+# Products carry the tokens of reservations in flight, so a reservation can
+# find out which of its updates applied
+RESERVATIONS_FIELD = 'stock_reservations'
+
+def reserve_stock(collection, quantities):
+    """Take {product_id: quantity} out of stock_quantity, all or nothing.
+
+    Every product gets a conditional $inc (stock_quantity >= quantity) in one
+    unordered, non-upsert bulk_write, so an order costs one round trip and
+    orders only contend on the products they share. Each update also adds a
+    token of this reservation to the product's stock_reservations.
+
+    When every product was modified the token is removed without waiting for
+    the server. Otherwise the products holding the token are exactly the
+    ones reserved: their stock is given back and the others (short or no
+    longer existing) are reported.
+
+    Returns the product IDs that could not be reserved (empty on success).
+    """
+    if not quantities:
+        return []
+    token = ObjectId()
+    items = list(quantities.items())
+    result = collection.bulk_write([
+        UpdateOne({'_id': product_id, 'stock_quantity': {'$gte': quantity}},
+                  {'$inc': {'stock_quantity': -quantity}, '$addToSet': {RESERVATIONS_FIELD: token}})
+        for product_id, quantity in items
+    ], ordered=False)
+
+    if result.modified_count == len(items):
+        collection.with_options(write_concern=WriteConcern(w=0)).update_many(
+            {RESERVATIONS_FIELD: token}, {'$pull': {RESERVATIONS_FIELD: token}})
+        return []
+
+    reserved = {product['_id'] for product in collection.find({RESERVATIONS_FIELD: token}, {'_id': 1})}
+    release_stock(collection, {product_id: quantity for product_id, quantity in items if product_id in reserved}, token)
+    return [product_id for product_id, _ in items if product_id not in reserved]
+
+def release_stock(collection, quantities, token=None):
+    """Put {product_id: quantity} back into stock_quantity.
+
+    With a reservation token, only products still holding it are updated and
+    the token is removed, so a reservation is never given back twice.
+    """
+    if not quantities:
+        return
+    operations = []
+    for product_id, quantity in quantities.items():
+        if token is None:
+            operations.append(UpdateOne({'_id': product_id}, {'$inc': {'stock_quantity': quantity}}))
+        else:
+            operations.append(UpdateOne({'_id': product_id, RESERVATIONS_FIELD: token},
+                                        {'$inc': {'stock_quantity': quantity}, '$pull': {RESERVATIONS_FIELD: token}}))
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        print(f"Error releasing stock: {e.details.get('writeErrors')}")
+
+def without_stock(product):
+    """Copy of a formatted product without stock_quantity, for caching"""
+    return {key: value for key, value in product.items() if key != 'stock_quantity'}
+
+def with_current_stock(collection, products):
+    """Copies of formatted products with stock_quantity read from MongoDB in one query.
+
+    Stock moves with every order without bumping the catalog version, so
+    cached payloads leave it out and get it back when they are served.
+    """
+    if not products:
+        return products
+    object_ids = [ObjectId(product['_id']) for product in products if ObjectId.is_valid(str(product.get('_id')))]
+    stock = {str(document['_id']): document.get('stock_quantity')
+             for document in collection.find({'_id': {'$in': object_ids}}, {'stock_quantity': 1})}
+    current = []
+    for product in products:
+        product = without_stock(product)
+        if stock.get(product.get('_id')) is not None:
+            product['stock_quantity'] = stock[product['_id']]
+        current.append(product)
+    return current
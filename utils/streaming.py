@@ -0,0 +1,75 @@
+from flask import Response, request, stream_with_context
+from utils.mongo_utils import MongoJSONEncoder
+import json
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Number of documents PyMongo fetches per round trip while streaming
+STREAM_BATCH_SIZE = 200
+
+# Serialized documents are buffered up to this many bytes before a chunk is sent
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def wants_ndjson():
+    """Check if the client asked for newline-delimited JSON via the Accept header"""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def _buffered(pieces):
+    """Group small string pieces into chunks of roughly STREAM_CHUNK_SIZE bytes."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_ndjson(documents, formatter, headers=None):
+    """Stream documents as NDJSON, serializing one document at a time.
+
+    `documents` is any iterable (usually a PyMongo cursor) and `formatter`
+    is applied to each document before it is encoded.
+    """
+    def generate():
+        for document in documents:
+            yield json.dumps(formatter(document), cls=MongoJSONEncoder) + '\n'
+
+    return Response(
+        stream_with_context(_buffered(generate())),
+        mimetype=NDJSON_MIMETYPE,
+        headers=headers
+    )
+
+def stream_json_array(documents, formatter, envelope=None, key=None, headers=None):
+    """Stream documents as a chunked JSON array.
+
+    When `envelope` is given the array is embedded in that object under `key`,
+    e.g. envelope={'total': 3}, key='products' streams {"total": 3, "products": [...]}.
+    """
+    if envelope is None:
+        prefix, suffix = '[', ']'
+    else:
+        head = json.dumps(envelope, cls=MongoJSONEncoder)
+        separator = ', ' if envelope else ''
+        prefix = head[:-1] + separator + json.dumps(key) + ': ['
+        suffix = ']}'
+
+    def generate():
+        yield prefix
+        first = True
+        for document in documents:
+            item = json.dumps(formatter(document), cls=MongoJSONEncoder)
+            yield item if first else ', ' + item
+            first = False
+        yield suffix
+
+    return Response(
+        stream_with_context(_buffered(generate())),
+        mimetype='application/json',
+        headers=headers
+    )
@@ -0,0 +1,231 @@
+from bisect import bisect_left, insort
+import heapq
+import threading
+from utils.text_index import tokenize, get_field_value
+from utils.catalog_version import VersionedLoader
+
+# Prefixes up to this length match too many phrases to rank per request, so
+# their top suggestions are kept precomputed. The lists hold more phrases than
+# a request can ask for, so phrases dropping out on writes rarely force a rescan.
+PRECOMPUTED_PREFIX_LENGTH = 2
+PRECOMPUTED_DEPTH_FACTOR = 4
+
+# Longer prefixes matching more keys than this have their ranking memoized on first use
+MEMOIZE_MIN_MATCHES = 200
+MEMO_SIZE = 10000
+
+def _stock(document):
+    stock = document.get('stock_quantity')
+    return stock if isinstance(stock, (int, float)) and not isinstance(stock, bool) else 0
+
+class SuggestIndex:
+    """Prefix index of catalog phrases for typeahead.
+
+    Every phrase is stored under each of its word suffixes ("dell xps 15",
+    "xps 15", "15") in one sorted list, so a typed prefix is found with a
+    bisect whether it starts the phrase or a later word. Phrases are ranked by
+    the number of products they appear in, then by their total stock. Values
+    differing only in case, accents or punctuation are merged and shown with
+    their most common spelling.
+
+    The phrases each product contributes are remembered, so saving or
+    deleting a product only touches its own phrases: their keys are inserted
+    into or removed from the sorted list, and the precomputed and memoized
+    rankings of their prefixes are updated.
+    """
+    def __init__(self, fields, max_limit=20):
+        # fields: suggestion type -> (possibly dotted) product field it comes from
+        self.fields = fields
+        self.max_limit = max_limit
+        self._groups = {}       # (type, normalized text) -> {'spellings', 'count', 'stock'}
+        self._doc_phrases = {}  # product ID -> [(group key, spelling, stock)]
+        self._keys = []         # sorted (word suffix, group key)
+        self._top = {}          # prefix -> (best group keys, whether they are all the matching groups)
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    @property
+    def top_depth(self):
+        return self.max_limit * PRECOMPUTED_DEPTH_FACTOR
+
+    def _phrases(self, document):
+        stock = _stock(document)
+        phrases = []
+        for suggestion_type, field in self.fields.items():
+            value = get_field_value(document, field)
+            if not isinstance(value, str) or not value.strip():
+                continue
+            text = ' '.join(tokenize(value))
+            if text:
+                phrases.append(((suggestion_type, text), value.strip(), stock))
+        return phrases
+
+    @staticmethod
+    def _suffixes(group_key):
+        words = group_key[1].split(' ')
+        return [' '.join(words[start:]) for start in range(len(words))]
+
+    def _rank(self, group_key):
+        group = self._groups[group_key]
+        return (-group['count'], -group['stock'], group_key)
+
+    def _best(self, group_keys, limit):
+        return heapq.nsmallest(limit, group_keys, key=self._rank)
+
+    def _matching_groups(self, prefix):
+        start = bisect_left(self._keys, (prefix,))
+        end = bisect_left(self._keys, (prefix + '\uffff',), start)
+        return {group_key for _, group_key in self._keys[start:end]}, end - start
+
+    def _entry(self, group_key):
+        group = self._groups[group_key]
+        return {
+            'text': max(group['spellings'].items(), key=lambda item: (item[1], item[0]))[0],
+            'type': group_key[0],
+            'count': group['count'],
+            'stock': group['stock']
+        }
+
+    def _apply(self, phrases, sign):
+        """Add (sign=1) or take away (sign=-1) a product's phrases. Returns the groups created or emptied."""
+        created, emptied = [], []
+        for group_key, spelling, stock in phrases:
+            group = self._groups.get(group_key)
+            if group is None:
+                group = self._groups[group_key] = {'spellings': {}, 'count': 0, 'stock': 0}
+                created.append(group_key)
+            group['spellings'][spelling] = group['spellings'].get(spelling, 0) + sign
+            if not group['spellings'][spelling]:
+                del group['spellings'][spelling]
+            group['count'] += sign
+            group['stock'] += sign * stock
+            if not group['count']:
+                del self._groups[group_key]
+                emptied.append(group_key)
+        return created, emptied
+
+    def load(self, documents):
+        """Replace the contents with the given product documents"""
+        with self._lock:
+            self._groups, self._doc_phrases, self._memo = {}, {}, {}
+            for document in documents:
+                doc_id = str(document['_id'])
+                phrases = self._phrases(document)
+                self._doc_phrases[doc_id] = phrases
+                self._apply(phrases, 1)
+
+            self._keys = sorted((suffix, group_key) for group_key in self._groups for suffix in self._suffixes(group_key))
+            top = {}
+            for suffix, group_key in self._keys:
+                for length in range(1, min(PRECOMPUTED_PREFIX_LENGTH, len(suffix)) + 1):
+                    top.setdefault(suffix[:length], set()).add(group_key)
+            self._top = {prefix: self._top_entry(group_keys) for prefix, group_keys in top.items()}
+
+    def _top_entry(self, group_keys):
+        return self._best(group_keys, self.top_depth), len(group_keys) <= self.top_depth
+
+    def add(self, document):
+        """Add or update a product"""
+        doc_id = str(document['_id'])
+        with self._lock:
+            self._replace(doc_id, self._phrases(document))
+
+    def remove(self, doc_id):
+        """Remove a product"""
+        with self._lock:
+            self._replace(str(doc_id), [])
+
+    def _replace(self, doc_id, phrases):
+        old_phrases = self._doc_phrases.pop(doc_id, [])
+        if phrases:
+            self._doc_phrases[doc_id] = phrases
+        touched = {group_key for group_key, _, _ in old_phrases} | {group_key for group_key, _, _ in phrases}
+        old_ranks = {group_key: self._rank(group_key) for group_key in touched if group_key in self._groups}
+
+        _, emptied = self._apply(old_phrases, -1)
+        created, _ = self._apply(phrases, 1)
+        # A group emptied and recreated by this update keeps its keys
+        for group_key in set(emptied) - set(created):
+            for suffix in self._suffixes(group_key):
+                position = bisect_left(self._keys, (suffix, group_key))
+                del self._keys[position]
+        for group_key in set(created) - set(emptied):
+            for suffix in self._suffixes(group_key):
+                insort(self._keys, (suffix, group_key))
+
+        # Update the rankings of every prefix of the touched phrases
+        prefixes = set()
+        for group_key in touched:
+            for suffix in self._suffixes(group_key):
+                for length in range(1, len(suffix) + 1):
+                    prefixes.add(suffix[:length])
+        for prefix in prefixes:
+            if len(prefix) > PRECOMPUTED_PREFIX_LENGTH:
+                self._memo.pop(prefix, None)
+            else:
+                self._update_top(prefix, touched, old_ranks)
+
+    def _update_top(self, prefix, touched, old_ranks):
+        """Bring the precomputed ranking of a prefix up to date after the touched groups changed"""
+        listed, complete = self._top.get(prefix, ([], True))
+        if listed:
+            # Unlisted phrases all rank below the last listed one as it ranked before the change
+            last = listed[-1]
+            boundary = old_ranks[last] if last in old_ranks else self._rank(last)
+        kept = [group_key for group_key in listed if group_key not in touched]
+        for group_key in touched:
+            if group_key not in self._groups or not any(suffix.startswith(prefix) for suffix in self._suffixes(group_key)):
+                continue
+            if complete or not listed or self._rank(group_key) < boundary:
+                kept.append(group_key)
+        kept.sort(key=self._rank)
+
+        if len(kept) > self.top_depth:
+            kept, complete = kept[:self.top_depth], False
+        if not complete and len(kept) < self.max_limit:
+            group_keys, _ = self._matching_groups(prefix)
+            kept, complete = self._top_entry(group_keys)
+        if kept:
+            self._top[prefix] = (kept, complete)
+        else:
+            self._top.pop(prefix, None)
+
+    def suggest(self, text, limit=10):
+        """Best phrases having a word sequence that starts with `text`"""
+        prefix = ' '.join(tokenize(text))
+        if not prefix:
+            return []
+        limit = min(limit, self.max_limit)
+
+        with self._lock:
+            if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+                group_keys = self._top.get(prefix, ([], True))[0]
+            elif prefix in self._memo:
+                group_keys = self._memo[prefix]
+            else:
+                matches, key_count = self._matching_groups(prefix)
+                group_keys = self._best(matches, self.max_limit)
+                if key_count >= MEMOIZE_MIN_MATCHES and len(self._memo) < MEMO_SIZE:
+                    self._memo[prefix] = group_keys
+            return [self._entry(group_key) for group_key in group_keys[:limit]]
+
+def build_suggest_index(documents, fields, max_limit=20):
+    """Build a SuggestIndex from product documents.
+
+    `fields` maps a suggestion type to the (possibly dotted) product field it
+    comes from.
+    """
+    index = SuggestIndex(fields, max_limit=max_limit)
+    index.load(documents)
+    return index
+
+class ProductSuggestIndex(VersionedLoader):
+    """SuggestIndex snapshot of the products collection, kept in step with the catalog version"""
+    def __init__(self, collection, fields, version, max_limit=20, refresh_seconds=300):
+        super().__init__(collection, version, refresh_seconds=refresh_seconds)
+        self.fields = fields
+        self.max_limit = max_limit
+        self.projection = dict({field: 1 for field in fields.values()}, stock_quantity=1)
+
+    def build(self, documents):
+        return build_suggest_index(documents, self.fields, self.max_limit)
@@ -0,0 +1,240 @@
+from bisect import bisect_left
+from collections import Counter
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from utils.catalog_version import VersionedLoader
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+_PIECE_PATTERN = re.compile(r'[a-z]+|[0-9]+')
+
+def fold_text(text):
+    """Lowercase text and strip diacritics (including the Vietnamese đ)."""
+    text = str(text).lower().replace('đ', 'd')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn')
+
+def tokenize(text):
+    """Split text into folded alphanumeric tokens"""
+    if not text:
+        return []
+    return _TOKEN_PATTERN.findall(fold_text(text))
+
+def index_terms(text):
+    """Tokens stored in the index for a text value.
+
+    Mixed tokens such as "16gb" or "i7" are also indexed by their letter and
+    digit pieces, so that both "16gb" and "16 gb" find them.
+    """
+    return set(term_counts(text))
+
+def term_counts(text):
+    """Frequency of every index term of a text value (see index_terms)"""
+    counts = Counter()
+    for token in tokenize(text):
+        counts[token] += 1
+        pieces = _PIECE_PATTERN.findall(token)
+        if len(pieces) > 1:
+            counts.update(pieces)
+    return counts
+
+def get_field_value(document, field):
+    """Read a (possibly dotted) field from a document"""
+    value = document
+    for part in field.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+# BM25 parameters: term frequency saturation and field length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Weight of a term the query token is only a prefix of, relative to an exact match
+PREFIX_MATCH_WEIGHT = 0.5
+
+class InvertedIndex:
+    """In-memory inverted index of product text fields with prefix matching.
+
+    Postings are kept per field (term -> {product ID: term frequency}) together
+    with a sorted vocabulary per field, so a query term is matched against every
+    indexed term it is a prefix of with a bisect instead of a scan. Field
+    lengths are kept per product so matches can be ranked with BM25.
+    """
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = {field: {} for field in self.fields}
+        self._vocabulary = {field: [] for field in self.fields}
+        self._stale_vocabulary = set()
+        self._doc_terms = {}
+        self._field_lengths = {field: {} for field in self.fields}
+        self._field_length_totals = {field: 0 for field in self.fields}
+
+    @property
+    def size(self):
+        """Number of indexed products"""
+        return len(self._doc_terms)
+
+    def _document_terms(self, document):
+        """Term frequencies and token count of every indexed field of a document"""
+        terms = {}
+        for field in self.fields:
+            value = get_field_value(document, field)
+            if isinstance(value, list):
+                value = ' '.join(str(item) for item in value)
+            if value is None:
+                continue
+            field_terms = term_counts(value)
+            if field_terms:
+                terms[field] = (field_terms, len(tokenize(value)))
+        return terms
+
+    def add(self, document):
+        """Index (or re-index) a product document"""
+        doc_id = str(document['_id'])
+        terms = self._document_terms(document)
+        with self._lock:
+            self._remove_locked(doc_id)
+            for field, (field_terms, length) in terms.items():
+                postings = self._postings[field]
+                for term, frequency in field_terms.items():
+                    if term not in postings:
+                        postings[term] = {}
+                        self._stale_vocabulary.add(field)
+                    postings[term][doc_id] = frequency
+                self._field_lengths[field][doc_id] = length
+                self._field_length_totals[field] += length
+            self._doc_terms[doc_id] = {field: set(field_terms) for field, (field_terms, _) in terms.items()}
+
+    def remove(self, doc_id):
+        """Remove a product from the index"""
+        with self._lock:
+            self._remove_locked(str(doc_id))
+
+    def _remove_locked(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if not terms:
+            return
+        for field, field_terms in terms.items():
+            postings = self._postings[field]
+            for term in field_terms:
+                ids = postings.get(term)
+                if ids is None:
+                    continue
+                ids.pop(doc_id, None)
+                if not ids:
+                    del postings[term]
+                    self._stale_vocabulary.add(field)
+            self._field_length_totals[field] -= self._field_lengths[field].pop(doc_id, 0)
+
+    def rebuild(self, documents):
+        """Replace the whole index with the given documents"""
+        with self._lock:
+            self._reset()
+            for document in documents:
+                self.add(document)
+
+    def _vocabulary_for(self, field):
+        if field in self._stale_vocabulary:
+            self._vocabulary[field] = sorted(self._postings[field])
+            self._stale_vocabulary.discard(field)
+        return self._vocabulary[field]
+
+    def _prefix_terms(self, field, prefix):
+        """Indexed terms of `field` that start with `prefix`"""
+        vocabulary = self._vocabulary_for(field)
+        start = bisect_left(vocabulary, prefix)
+        end = start
+        while end < len(vocabulary) and vocabulary[end].startswith(prefix):
+            end += 1
+        return vocabulary[start:end]
+
+    def _prefix_matches(self, field, prefix):
+        """Product IDs having a term in `field` that starts with `prefix`."""
+        postings = self._postings[field]
+        matches = set()
+        for term in self._prefix_terms(field, prefix):
+            matches.update(postings[term])
+        return matches
+
+    def match(self, clauses):
+        """Find products matching every clause.
+
+        `clauses` is a list of (fields, text) pairs. A clause matches a product
+        when every token of `text` is a prefix of a term in one of `fields`.
+        Returns a set of product IDs, or None if no clause contained a token.
+        """
+        with self._lock:
+            result = None
+            for fields, text in clauses:
+                for token in tokenize(text):
+                    token_matches = set()
+                    for field in fields:
+                        token_matches |= self._prefix_matches(field, token)
+                    result = token_matches if result is None else result & token_matches
+                    if not result:
+                        return set()
+            return result
+
+    def rank(self, text, field_weights, candidates, k):
+        """Top `k` candidate products for `text` by field-weighted BM25.
+
+        Scores are accumulated term-at-a-time from the postings, with every
+        query token expanded to the indexed terms it is a prefix of (exact
+        terms count fully, longer ones with PREFIX_MATCH_WEIGHT). Per-field
+        frequencies are length-normalized and weighted before saturation
+        (BM25F). Returns a list of (product ID, score), best first; candidates
+        without any matching term score 0 and come last.
+        """
+        candidates = {str(candidate) for candidate in candidates}
+        with self._lock:
+            total_documents = max(self.size, 1)
+            average_lengths = {
+                field: self._field_length_totals[field] / max(len(self._field_lengths[field]), 1)
+                for field in field_weights
+            }
+            scores = dict.fromkeys(candidates, 0.0)
+            for token in set(tokenize(text)):
+                # Weighted, length-normalized frequency of the token per product
+                frequencies = {}
+                for field, weight in field_weights.items():
+                    postings = self._postings[field]
+                    lengths = self._field_lengths[field]
+                    average_length = average_lengths[field] or 1
+                    for term in self._prefix_terms(field, token):
+                        term_weight = weight * (1 if term == token else PREFIX_MATCH_WEIGHT)
+                        for doc_id, frequency in postings[term].items():
+                            norm = 1 - BM25_B + BM25_B * lengths.get(doc_id, 0) / average_length
+                            frequencies[doc_id] = frequencies.get(doc_id, 0.0) + term_weight * frequency / norm
+
+                # Documents containing the token anywhere give its document frequency
+                document_frequency = len(frequencies)
+                idf = math.log(1 + (total_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+                for doc_id, frequency in frequencies.items():
+                    if doc_id in scores:
+                        scores[doc_id] += idf * frequency * (BM25_K1 + 1) / (BM25_K1 + frequency)
+        # Ties go to the newer product (larger ObjectId)
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+
+class ProductTextIndex(VersionedLoader):
+    """InvertedIndex snapshot of the products collection, kept in step with the catalog version.
+
+    A search therefore never matches against an index older than the
+    catalog version it is cached under.
+    """
+    def __init__(self, collection, fields, version, refresh_seconds=300):
+        super().__init__(collection, version, refresh_seconds=refresh_seconds)
+        self.fields = fields
+        self.projection = {field: 1 for field in fields}
+
+    def build(self, documents):
+        snapshot = InvertedIndex(self.fields)
+        snapshot.rebuild(documents)
+        return snapshot